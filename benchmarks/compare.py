@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files written by ``benchmarks/run.py``.
+
+Prints the best time of every benchmark present in both files and the
+ratio candidate / baseline. Exits with status 1 when any benchmark got
+slower by more than ``--threshold``.
+"""
+import sys
+import json
+import argparse
+
+
+def load(path):
+    with open(path) as f:
+        results = json.load(f)
+    return results['meta'], {(r['name'], r['rows']): r for r in results['results']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    base_meta, baseline = load(args.baseline)
+    cand_meta, candidate = load(args.candidate)
+    print(f"baseline:  {base_meta.get('commit')} ({args.baseline})")
+    print(f"candidate: {cand_meta.get('commit')} ({args.candidate})")
+    print()
+    print(f"{'benchmark':<36} {'rows':>10} {'baseline':>10} {'candidate':>10} {'ratio':>7}")
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key]['best'], candidate[key]['best']
+        ratio = after / before if before else float('inf')
+        flag = ''
+        if ratio > args.threshold:
+            flag = '  slower'
+            regressions += 1
+        elif ratio < 1 / args.threshold:
+            flag = '  faster'
+        print(f'{key[0]:<36} {key[1]:>10,} {before:10.4f} {after:10.4f} {ratio:7.2f}{flag}')
+
+    missing = baseline.keys() ^ candidate.keys()
+    if missing:
+        print(f'\n{len(missing)} benchmarks only ran in one of the files')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Benchmarks for the access, iteration, splitting and I/O hot paths.
+
+All data is synthetic and generated in a scratch directory, so the suite
+runs offline. Results are written as JSON and can be compared between runs
+with ``benchmarks/compare.py``::
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --output after.json
+    python benchmarks/compare.py before.json after.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from datastore.data import P3B3, KuzushijiMNIST, RandomData, RandomMultiTaskData  # noqa: E402
+from datastore.sampling import (  # noqa: E402
+    leave_one_out_bootstrap, multitask_stratified_split, stratified_split
+)
+from datastore.utils.utils import check_integrity, hash_file  # noqa: E402
+
+
+# Registered benchmarks as (name, group, max_rows, setup)
+BENCHMARKS = []
+
+# Samples touched by the indexing and iteration benchmarks, whatever the size
+NUM_ACCESSES = 10000
+BATCH_SIZE = 256
+DOC_LENGTH = 300
+
+
+def benchmark(group, max_rows=None):
+    """Register a benchmark.
+
+    The decorated function takes the number of rows and a scratch
+    directory, does any setup, and returns a callable to time together
+    with the number of items that callable processes.
+    """
+    def register(setup):
+        BENCHMARKS.append((setup.__name__, group, max_rows, setup))
+        return setup
+    return register
+
+
+def p3b3(rows, workdir, mmap=False):
+    root = os.path.join(workdir, f'p3b3-{rows}')
+    processed = os.path.join(root, 'P3B3', 'processed')
+    if not os.path.isdir(processed):
+        os.makedirs(processed)
+        rng = np.random.default_rng(0)
+        np.save(os.path.join(processed, 'train_data.npy'),
+                rng.integers(5000, size=(rows, DOC_LENGTH), dtype=np.int32))
+        np.save(os.path.join(processed, 'train_labels.npy'),
+                rng.integers(10, size=(rows, 4)))
+        for name in ('test_data.npy', 'test_labels.npy'):
+            shutil.copyfile(os.path.join(processed, name.replace('test', 'train')),
+                            os.path.join(processed, name))
+    return P3B3(root, 'train', mmap=mmap)
+
+
+def kmnist(rows, workdir, mmap=False):
+    root = os.path.join(workdir, f'kmnist-{rows}')
+    processed = os.path.join(root, 'KuzushijiMNIST', 'processed')
+    if not os.path.isdir(processed):
+        os.makedirs(processed)
+        rng = np.random.default_rng(0)
+        np.save(os.path.join(processed, 'train_data.npy'),
+                rng.integers(255, size=(rows, 28, 28), dtype=np.uint8))
+        np.save(os.path.join(processed, 'train_labels.npy'), rng.integers(10, size=rows))
+        for name in ('test_data.npy', 'test_labels.npy'):
+            shutil.copyfile(os.path.join(processed, name.replace('test', 'train')),
+                            os.path.join(processed, name))
+    return KuzushijiMNIST(root, 'train', mmap=mmap)
+
+
+def multitask(rows, workdir):
+    return RandomMultiTaskData(rows, 4, 10)
+
+
+DATASETS = {'p3b3': p3b3, 'kmnist': kmnist, 'multitask': multitask}
+
+
+def _sample_indices(rows):
+    return np.random.default_rng(0).integers(rows, size=NUM_ACCESSES)
+
+
+def _per_sample(make):
+    def setup(rows, workdir):
+        dataset = make(rows, workdir)
+        indices = _sample_indices(rows)
+
+        def run():
+            for idx in indices:
+                dataset[idx]
+        return run, len(indices)
+    return setup
+
+
+def _batched(make):
+    def setup(rows, workdir):
+        dataset = make(rows, workdir)
+        indices = _sample_indices(rows)
+
+        def run():
+            for start in range(0, len(indices), BATCH_SIZE):
+                dataset.get_batch(indices[start:start + BATCH_SIZE])
+        return run, len(indices)
+    return setup
+
+
+for _name, _make in DATASETS.items():
+    for _kind, _wrap in (('getitem', _per_sample), ('get_batch', _batched)):
+        _setup = _wrap(_make)
+        _setup.__name__ = f'{_kind}_{_name}'
+        benchmark('indexing', max_rows=10 ** 6)(_setup)
+
+for _name in ('p3b3', 'kmnist'):
+    _setup = _batched(lambda rows, workdir, make=DATASETS[_name]: make(rows, workdir, mmap=True))
+    _setup.__name__ = f'get_batch_{_name}_mmap'
+    benchmark('indexing', max_rows=10 ** 6)(_setup)
+
+
+@benchmark('iteration', max_rows=10 ** 6)
+def iterate_kmnist(rows, workdir):
+    dataset = kmnist(rows, workdir)
+
+    def run():
+        for _ in dataset:
+            pass
+    return run, rows
+
+
+@benchmark('iteration', max_rows=10 ** 6)
+def iterate_multitask(rows, workdir):
+    dataset = multitask(rows, workdir)
+
+    def run():
+        for _ in dataset:
+            pass
+    return run, rows
+
+
+@benchmark('splitting')
+def stratified_split_5fold(rows, workdir):
+    dataset = RandomData(rows, 10)
+    return lambda: stratified_split(dataset, 5), rows
+
+
+@benchmark('splitting')
+def multitask_stratified_split_5fold(rows, workdir):
+    dataset = RandomMultiTaskData(rows, 4, 10)
+    return lambda: multitask_stratified_split(dataset, 5, 'task0'), rows
+
+
+@benchmark('splitting')
+def leave_one_out_bootstrap_100(rows, workdir):
+    dataset = RandomData(rows, 10)
+
+    def run():
+        for _ in leave_one_out_bootstrap(dataset, 100, lazy=True):
+            pass
+    return run, rows
+
+
+def _fresh():
+    """ An empty multitask dataset to load into, leaving the benchmarked one unchanged """
+    return RandomMultiTaskData(1, 1, 1)
+
+
+@benchmark('io', max_rows=10 ** 6)
+def dataframe_kmnist(rows, workdir):
+    dataset = kmnist(rows, workdir)
+    return dataset.dataframe, rows
+
+
+@benchmark('io', max_rows=10 ** 5)
+def csv_round_trip_multitask(rows, workdir):
+    dataset = multitask(rows, workdir)
+    path = os.path.join(workdir, f'multitask-{rows}.csv')
+
+    def run():
+        dataset.to_csv(path)
+        _fresh().load_cached(path)
+    return run, rows
+
+
+@benchmark('io', max_rows=10 ** 6)
+def cache_round_trip_p3b3(rows, workdir):
+    dataset = p3b3(rows, workdir)
+    path = os.path.join(workdir, f'p3b3-{rows}.cache')
+
+    def run():
+        dataset.to_cache(path)
+        _fresh().load_cached(path)
+    return run, rows
+
+
+@benchmark('integrity', max_rows=10 ** 7)
+def check_integrity_sha256(rows, workdir):
+    """ Hashes a file of `rows` KiB, without the digest cache """
+    path = os.path.join(workdir, f'blob-{rows}.bin')
+    if not os.path.exists(path):
+        block = np.random.default_rng(0).bytes(1024)
+        with open(path, 'wb') as f:
+            for _ in range(rows):
+                f.write(block)
+    checksum = 'sha256:' + hash_file(path)
+
+    def run():
+        # Drop the digest cache so every repeat hashes the file again
+        cache = os.path.join(workdir, '.checksums.json')
+        if os.path.exists(cache):
+            os.unlink(cache)
+        assert check_integrity(path, checksum=checksum)
+    return run, rows * 1024
+
+
+def measure(run, repeats, warmup=1):
+    # Untimed runs first, so lazy imports and caches are not measured
+    for _ in range(warmup):
+        run()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e4, 1e5],
+                        help='row counts to run each benchmark at, e.g. 1e4 1e5 1e6 1e7')
+    parser.add_argument('--groups', nargs='+',
+                        choices=sorted({group for _, group, _, _ in BENCHMARKS}),
+                        help='only run these groups of benchmarks')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs before the timed ones')
+    parser.add_argument('--workdir', help='scratch directory, a temporary one by default')
+    parser.add_argument('--output', default='benchmarks.json')
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='datastore-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    results = []
+    try:
+        for name, group, max_rows, setup in BENCHMARKS:
+            if args.groups and group not in args.groups or args.filter not in name:
+                continue
+
+            for rows in map(int, args.sizes):
+                if max_rows is not None and rows > max_rows:
+                    continue
+
+                run, items = setup(rows, workdir)
+                times = measure(run, args.repeats, args.warmup)
+                best = min(times)
+                results.append({
+                    'name': name,
+                    'group': group,
+                    'rows': rows,
+                    'items': items,
+                    'best': best,
+                    'median': float(np.median(times)),
+                    'times': times,
+                    'items_per_second': items / best if best else None,
+                })
+                print(f'{name:<36} {rows:>10,} rows  {best:10.4f}s  '
+                      f'{items / best if best else float("inf"):14,.0f} items/s')
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
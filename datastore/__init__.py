@@ -2,6 +2,19 @@ __author__ = 'Todd Young'
 __email__ = 'youngmt1@ornl.gov'
 __version__ = '0.2.6'
 
-from . import data
-from . import sampling
-from . import utils
+import importlib
+
+
+# Subpackages are imported on first access (PEP 562), so that
+# `import datastore` does not pull in torch, pandas or sklearn.
+_SUBPACKAGES = ('api', 'data', 'sampling', 'store', 'utils')
+
+
+def __getattr__(name):
+    if name in _SUBPACKAGES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_SUBPACKAGES))
@@ -1,3 +1,11 @@
 from .data import (
-    Dataset, InMemoryDataset, MultiTaskDataset
+    Dataset, InMemoryDataset, MultiTaskDataset, collate
 )
+
+from .loader import BatchLoader
+from .stats import DatasetStats
+from .transforms import (
+    Transform, Compose, Lambda, ToFloat, Clip, Remap
+)
+from .cache import CachedDataset
+from .labels import LabelStore
@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class MemmapArray:
+    """Lazily opened, memory-mapped view of a ``.npy`` file.
+
+    The file is only mapped on first access, and pickling keeps the path
+    rather than the array, so worker processes reopen the mapping and
+    share the page cache instead of each receiving a private copy.
+
+    Parameters
+    ----------
+    path : str
+        Path to the ``.npy`` file.
+
+    col : int, optional
+        If given, only this column of a 2-D array is exposed.
+
+    mmap_mode : str
+        Mode passed to `np.load`. Defaults to read-only.
+    """
+
+    def __init__(self, path, col=None, mmap_mode='r'):
+        self.path = path
+        self.col = col
+        self.mmap_mode = mmap_mode
+        self._array = None
+
+    @property
+    def array(self):
+        """ The mapped array, opened on first access """
+        if self._array is None:
+            array = np.load(self.path, mmap_mode=self.mmap_mode)
+            if self.col is not None:
+                array = array[:, self.col]
+            self._array = array
+        return self._array
+
+    def column(self, col):
+        """ Lazily project a single column of a 2-D array """
+        return MemmapArray(self.path, col=col, mmap_mode=self.mmap_mode)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def dtype(self):
+        return self.array.dtype
+
+    @property
+    def ndim(self):
+        return self.array.ndim
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, idx):
+        return self.array[idx]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Reopen in the receiving process rather than serializing the data
+        state['_array'] = None
+        return state
+
+    def __repr__(self):
+        return f'MemmapArray({self.path!r}, col={self.col!r})'
@@ -0,0 +1,293 @@
+"""
+Memoization of transformed samples.
+
+`CachedDataset` keeps the samples of a wrapped dataset, transforms
+included, in an in-memory LRU bounded by a byte budget. Entries evicted
+from memory can be spilled to a directory on local disk, where they are
+keyed by a fingerprint of the dataset, the identity of its transforms and
+the sample index, so later runs over the same data reuse them.
+"""
+import os
+import pickle
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from datastore.api.data import Dataset, Subset, collate
+from datastore.api.stats import TRANSFORMS, sample_nbytes
+
+
+def _update(digest, value):
+    """ Feed a sample, or a structure of samples, to a hash """
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode())
+            _update(digest, value[key])
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _update(digest, item)
+    elif hasattr(value, 'shape'):
+        array = np.ascontiguousarray(np.asarray(value))
+        digest.update(f'{array.dtype.str}{array.shape}'.encode())
+        digest.update(array.tobytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+def fingerprint(dataset):
+    """Identify the contents of a dataset.
+
+    Datasets can define their own `fingerprint` method. Otherwise the
+    fingerprint combines the class, the length, the location and partition
+    attributes when there are any, and the first, middle and last samples.
+    A `Subset` combines the fingerprint of its dataset with its indices.
+    """
+    if hasattr(dataset, 'fingerprint'):
+        return dataset.fingerprint()
+
+    if isinstance(dataset, Subset):
+        digest = hashlib.sha256(f'subset:{fingerprint(dataset.dataset)}'.encode())
+        _update(digest, dataset.indices)
+        return digest.hexdigest()[:16]
+
+    digest = hashlib.sha256()
+    cls = type(dataset)
+    digest.update(f'{cls.__module__}.{cls.__qualname__}:{len(dataset)}'.encode())
+    for attr in ('root', 'path', 'partition', 'inputs'):
+        if hasattr(dataset, attr):
+            digest.update(f'{attr}={getattr(dataset, attr)!r}'.encode())
+    if len(dataset):
+        for idx in sorted({0, len(dataset) // 2, len(dataset) - 1}):
+            _update(digest, dataset[idx])
+    return digest.hexdigest()[:16]
+
+
+def _identity(transform):
+    """ Name of a transform that is the same across runs, or None """
+    if transform is None:
+        return 'None'
+    if hasattr(transform, '__qualname__'):
+        identity = f'{transform.__module__}.{transform.__qualname__}'
+        # Every lambda, or closure, of a scope shares its qualified name
+        return None if '<lambda>' in identity or '<locals>' in identity else identity
+    if type(transform).__repr__ is not object.__repr__:
+        identity = repr(transform)
+        # Reprs of wrapped functions, e.g. `Lambda`, hold their address
+        return None if ' at 0x' in identity else identity
+    return f'{type(transform).__module__}.{type(transform).__qualname__}'
+
+
+def transform_key(dataset):
+    """Identify the `transform` and `target_transform` of a dataset.
+
+    Raises a ValueError when a transform has no stable identity, such as
+    a lambda, since its spilled samples could be mistaken for another's.
+    """
+    if isinstance(dataset, Subset):
+        dataset = dataset.dataset
+
+    parts = []
+    for kind in TRANSFORMS:
+        identity = _identity(getattr(dataset, kind, None))
+        if identity is None:
+            raise ValueError(f'The {kind} of {type(dataset).__name__} has no stable '
+                             f'identity, pass a `key` to tell it apart.')
+        parts.append(f'{kind}={identity}')
+    return hashlib.sha256(';'.join(parts).encode()).hexdigest()[:16]
+
+
+def _row(batch, i):
+    """ Sample `i` of a collated batch """
+    if isinstance(batch, dict):
+        return {key: _row(value, i) for key, value in batch.items()}
+    if isinstance(batch, tuple):
+        return tuple(_row(value, i) for value in batch)
+    return batch[i]
+
+
+class CachedDataset(Dataset):
+    """Cache the transformed samples of a dataset.
+
+    Samples are kept in memory, least recently used first out, as long as
+    their total size stays within `max_bytes`. When `spill_dir` is given,
+    evicted samples are written there instead of being dropped, and are
+    read back on their next access rather than recomputed.
+
+    Only wrap datasets whose transforms are deterministic: a cached sample
+    is returned as is for every later access, across epochs and runs.
+
+    Parameters
+    ----------
+    dataset : datastore.api.Dataset
+        Dataset to cache.
+
+    max_bytes : int
+        Budget of the in-memory cache, in bytes.
+
+    spill_dir : str, optional
+        Directory receiving samples evicted from memory.
+
+    key : str, optional
+        Identity of the transforms, used to key the spilled samples. By
+        default it is derived from their qualified names or reprs. It is
+        required with `spill_dir` when those are not stable, e.g. for
+        lambdas, closures and `Lambda` stages.
+
+    Attributes
+    ----------
+    hits, disk_hits, misses, evictions : int
+        Accesses served from memory, served from disk, fetched from the
+        wrapped dataset, and samples evicted from memory.
+    """
+
+    def __init__(self, dataset, max_bytes=1 << 30, spill_dir=None, key=None):
+        self.dataset = dataset
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.key = key
+        self.nbytes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if spill_dir is not None:
+            if key is None:
+                self.key = transform_key(dataset)
+            self.spill_path = os.path.join(spill_dir, fingerprint(dataset), self.key)
+            os.makedirs(self.spill_path, exist_ok=True)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def _file(self, idx):
+        return os.path.join(self.spill_path, f'{idx}.pkl')
+
+    def _lookup(self, idx):
+        """ Cached sample at `idx`, or None """
+        with self._lock:
+            entry = self._entries.get(idx)
+            if entry is not None:
+                self._entries.move_to_end(idx)
+                self.hits += 1
+                self._record(hit=True)
+                return entry[0]
+
+        if self.spill_dir is not None:
+            try:
+                with open(self._file(idx), 'rb') as f:
+                    sample = pickle.load(f)
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._record(hit=True)
+                self._insert(idx, sample, spilled=True)
+                return sample
+
+        with self._lock:
+            self.misses += 1
+            self._record(hit=False)
+        return None
+
+    def _record(self, hit):
+        if self.stats is not None:
+            self.stats.record_cache(hit)
+
+    def _insert(self, idx, sample, spilled=False):
+        nbytes = sample_nbytes(sample)
+        evicted = []
+        with self._lock:
+            if idx in self._entries:
+                return
+            if nbytes <= self.max_bytes:
+                self._entries[idx] = (sample, nbytes, spilled)
+                self.nbytes += nbytes
+            else:
+                evicted.append((idx, (sample, nbytes, spilled)))
+
+            while self.nbytes > self.max_bytes:
+                old_idx, entry = self._entries.popitem(last=False)
+                self.nbytes -= entry[1]
+                self.evictions += 1
+                evicted.append((old_idx, entry))
+
+        for old_idx, (old_sample, _, old_spilled) in evicted:
+            if self.spill_dir is not None and not old_spilled:
+                self._spill(old_idx, old_sample)
+
+    def _spill(self, idx, sample):
+        path = self._file(idx)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(sample, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Readers in other processes never see a partial file
+        os.replace(tmp, path)
+
+    def __getitem__(self, idx):
+        idx = int(idx)
+        sample = self._lookup(idx)
+        if sample is None:
+            sample = self.dataset[idx]
+            self._insert(idx, sample)
+        return sample
+
+    def get_batch(self, indices):
+        indices = [int(idx) for idx in indices]
+        if not indices:
+            # Keep the structure of the wrapped dataset's empty batch
+            return self.dataset.get_batch(np.array(indices, dtype=np.intp))
+        samples = [self._lookup(idx) for idx in indices]
+
+        # Everything not cached yet is fetched in one batch
+        missing = [pos for pos, sample in enumerate(samples) if sample is None]
+        if missing:
+            batch = self.dataset.get_batch(np.array([indices[pos] for pos in missing]))
+            for i, pos in enumerate(missing):
+                samples[pos] = _row(batch, i)
+                self._insert(indices[pos], samples[pos])
+
+        return collate(samples)
+
+    def cache_info(self):
+        """ Counters of the cache, as a dict """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def cache_clear(self):
+        """ Drop the in-memory entries, spilled samples are kept """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def on_epoch_end(self):
+        self.dataset.on_epoch_end()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Each process keeps its own in-memory entries, and shares the spill
+        state['_entries'] = OrderedDict()
+        state['nbytes'] = 0
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        info = self.cache_info()
+        return (f'{self.__class__.__name__}({self.dataset.__class__.__name__}, '
+                f'entries={info["entries"]}, nbytes={info["nbytes"]}, hits={info["hits"]}, '
+                f'misses={info["misses"]})')
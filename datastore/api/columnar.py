@@ -0,0 +1,184 @@
+"""
+Binary columnar cache format.
+
+A cache is a directory holding one ``.npy`` file per column and a
+``manifest.json`` describing the columns. Feature data is stored in the
+``data`` column (or ``data.<key>`` columns when the data is a dict of
+arrays, as in Uno) and labels in the ``labels`` column (or
+``labels.<task>`` columns for multitask datasets). Dtypes and shapes are
+kept exactly, and columns can be read on their own or memory-mapped.
+"""
+import os
+import json
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+KEY_FIELDS = {'data': 'data_keys', 'labels': 'label_keys'}
+
+
+def _is_tensor(value):
+    return type(value).__module__.startswith('torch')
+
+
+def _group(prefix, value):
+    """ Flatten a data or label group into (column name, key, array) """
+    if hasattr(value, 'keys'):
+        return [(f'{prefix}.{key}', key, value[key]) for key in value.keys()]
+    return [(prefix, None, value)]
+
+
+def open_column(path, name, shape, dtype):
+    """Create a column of a cache, to be filled in place.
+
+    The column is a writable memory map of its ``.npy`` file, so it can be
+    filled chunk by chunk without holding it in memory. Once every column
+    is filled, pass it to `write_columnar` with its name in `filled`.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the cache. Created if it does not exist.
+
+    name : str
+        Name of the column, e.g. ``'data.gene_data'``.
+
+    shape : tuple of int
+        Shape of the column.
+
+    dtype : dtype
+        Dtype of the column.
+    """
+    os.makedirs(path, exist_ok=True)
+    return np.lib.format.open_memmap(os.path.join(path, f'{name}.npy'), mode='w+',
+                                     dtype=dtype, shape=tuple(shape))
+
+
+def write_columnar(path, data, labels, filled=()):
+    """Write data and labels as a binary columnar cache.
+
+    Parameters
+    ----------
+    path : str
+        Directory to write the cache to. Created if it does not exist.
+
+    data : array, tensor or dict
+        Feature data, as returned by `InMemoryDataset.load_data`.
+
+    labels : array, tensor or dict
+        Labels, as returned by `InMemoryDataset.load_data`.
+
+    filled : collection of str
+        Columns already filled in place in `path` with `open_column`.
+        They are only described in the manifest, not written again.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'data_keys': None,
+        'label_keys': None,
+        'columns': {},
+    }
+
+    for prefix, value in (('data', data), ('labels', labels)):
+        group = _group(prefix, value)
+        if group[0][1] is not None:
+            manifest[KEY_FIELDS[prefix]] = [key for _, key, _ in group]
+
+        for name, _, column in group:
+            kind = 'torch' if _is_tensor(column) else 'numpy'
+            array = column.numpy() if kind == 'torch' else np.asarray(column)
+            filename = f'{name}.npy'
+            if name not in filled:
+                np.save(os.path.join(path, filename), array)
+            manifest['columns'][name] = {
+                'file': filename,
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'kind': kind,
+            }
+
+    # The manifest goes last so a partially written cache is never valid.
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(path):
+    """ Read the manifest of a columnar cache """
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported cache format in {path}')
+
+    return manifest
+
+
+def is_columnar(path):
+    """ Check whether `path` holds a columnar cache """
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _selected(name, columns):
+    if columns is None:
+        return True
+    return name in columns or name.split('.', 1)[0] in columns
+
+
+def read_columnar(path, columns=None, mmap=False):
+    """Read a binary columnar cache.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the cache.
+
+    columns : list of str, optional
+        Columns to load, e.g. ``['labels.subsite']``. Passing ``'data'`` or
+        ``'labels'`` selects every column of that group. Loads all columns
+        by default.
+
+    mmap : bool
+        If true, columns are memory-mapped rather than read into memory.
+
+    Returns
+    -------
+    data, labels : tuple
+        With the same structure that was written. Groups without any
+        selected column are returned as None.
+    """
+    manifest = read_manifest(path)
+
+    groups = {}
+    for prefix, key_field in KEY_FIELDS.items():
+        keys = manifest[key_field]
+        loaded = {}
+        for name, info in manifest['columns'].items():
+            if name.split('.', 1)[0] != prefix or not _selected(name, columns):
+                continue
+
+            torch_kind = info['kind'] == 'torch'
+            # Copy-on-write keeps mapped tensors writable without touching the file
+            mmap_mode = ('c' if torch_kind else 'r') if mmap else None
+            array = np.load(os.path.join(path, info['file']), mmap_mode=mmap_mode)
+
+            if torch_kind:
+                import torch
+                array = torch.from_numpy(array)
+
+            loaded[name] = array
+
+        if not loaded:
+            groups[prefix] = None
+        elif keys is None:
+            groups[prefix] = loaded[prefix]
+        else:
+            groups[prefix] = {
+                key: loaded[f'{prefix}.{key}'] for key in keys
+                if f'{prefix}.{key}' in loaded
+            }
+
+    return groups['data'], groups['labels']
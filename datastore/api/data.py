@@ -1,11 +1,110 @@
 from abc import abstractmethod
+from contextlib import contextmanager
 
-import pandas as pd
+import numpy as np
+
+from datastore.api.columnar import is_columnar, read_columnar, write_columnar
+from datastore.api.labels import LabelStore
+from datastore.api.shared import release, share
+from datastore.api.stats import TRANSFORMS, DatasetStats, TimedTransform, instrumented
+
+
+def collate(samples):
+    """Stack a sequence of samples into a single batch.
+
+    Parameters
+    ----------
+    samples : sequence
+        Samples as returned by `Dataset.__getitem__`. Tuples and dicts
+        are collated element-wise, arrays and tensors are stacked along
+        a new leading axis.
+
+    Returns
+    -------
+    A batch with the same structure as a single sample. Without any
+    sample that structure is unknown, and an empty array is returned.
+    """
+    if not len(samples):
+        return np.empty(0)
+
+    first = samples[0]
+
+    if isinstance(first, dict):
+        return {key: collate([sample[key] for sample in samples]) for key in first}
+
+    if isinstance(first, tuple):
+        return tuple(collate(list(field)) for field in zip(*samples))
+
+    if type(first).__module__.startswith('torch'):
+        import torch
+        return torch.stack(samples)
+
+    return np.stack(samples)
+
+
+def index_array(indices, size):
+    """Convert indices into a compact integer array.
+
+    Parameters
+    ----------
+    indices : sequence of int
+        Index positions into a dataset.
+
+    size : int
+        Number of samples in the dataset being indexed.
+
+    Returns
+    -------
+    np.ndarray of int32, or int64 if `size` does not fit in int32.
+    """
+    dtype = np.int32 if size <= np.iinfo(np.int32).max else np.int64
+    return np.asarray(indices, dtype=dtype)
+
+
+def _frame(data, labels, start=0):
+    """ Build a pd.DataFrame with one row per sample, indexed from `start` """
+    import pandas as pd
+
+    data_dict = {}
+    if data is not None:
+        data = np.asarray(data)
+        # pandas columns are 1-D, so each row of n-D data is stored as an array
+        data_dict['data'] = list(data) if data.ndim > 1 else data
+
+    if labels is not None:
+        if hasattr(labels, 'keys'):
+            # We are in the multitask case
+            for key in labels.keys():
+                data_dict[key] = np.asarray(labels[key])
+        else:
+            data_dict['labels'] = np.asarray(labels)
+
+    length = len(next(iter(data_dict.values())))
+    return pd.DataFrame(data_dict, index=pd.RangeIndex(start, start + length))
+
+
+def _chunk(value, start, stop):
+    """ Slice a data or label group, keeping the multitask structure """
+    if value is None:
+        return None
+    if hasattr(value, 'keys'):
+        return {key: value[key][start:stop] for key in value.keys()}
+    return value[start:stop]
 
 
 class Dataset:
     """ Abstract dataset - Used for both Keras and Pytorch"""
 
+    # Access counters, set by `instrument`
+    stats = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in ('__getitem__', 'get_batch'):
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, '__instrumented__', False):
+                setattr(cls, name, instrumented(method, batched=name == 'get_batch'))
+
     @abstractmethod
     def __getitem__(self, idx):
         """Gets batch at position `index`.
@@ -30,6 +129,104 @@ class Dataset:
         """
         raise NotImplementedError
 
+    def get_batch(self, indices):
+        """Gets the samples at positions `indices` as one batch.
+
+        Subclasses should override this with a single gather over their
+        underlying arrays. The default falls back to per-sample indexing.
+
+        Parameters
+        ----------
+        indices: sequence of index positions in the data.
+
+        Returns
+        -------
+        A batch with the data stacked along the first axis and the
+        labels gathered the same way (per task for multitask data).
+
+        This is not torch's `__getitems__`, which returns a list of
+        samples, so a torch `DataLoader` keeps indexing sample by sample
+        and collating with its own `collate_fn`.
+        """
+        return collate([self[idx] for idx in indices])
+
+    get_batch = instrumented(get_batch, batched=True)
+
+    @staticmethod
+    def _map_batch(transform, batch):
+        """Apply `transform` across a gathered batch.
+
+        Transforms marked `batched` are called once on the whole batch,
+        and pipelines such as `Compose` provide their own `map_batch`.
+        Any other callable is applied sample by sample, where the samples
+        of a tuple batch, e.g. multi-input data, are tuples themselves.
+        """
+        if getattr(transform, 'batched', False):
+            return transform(batch)
+        map_batch = getattr(transform, 'map_batch', None)
+        if map_batch is not None:
+            return map_batch(batch)
+        samples = list(zip(*batch)) if isinstance(batch, tuple) else batch
+        if not len(samples):
+            # An empty batch has no sample to transform
+            return batch
+        return collate([transform(sample) for sample in samples])
+
+    @contextmanager
+    def instrument(self, reset=False):
+        """Record fetch and transform timings while the context is active.
+
+        Counters accumulate in `self.stats` across uses of the context,
+        and can be exported with `self.stats.as_dict()`.
+
+        Parameters
+        ----------
+        reset : bool
+            If true, start again from zero instead of accumulating.
+
+        Yields
+        ------
+        stats : datastore.api.DatasetStats
+        """
+        if self.stats is None:
+            self.stats = DatasetStats()
+        elif reset:
+            self.stats.reset()
+
+        wrapped = {}
+        for kind in TRANSFORMS:
+            transform = getattr(self, kind, None)
+            if transform is not None and not isinstance(transform, TimedTransform):
+                wrapped[kind] = transform
+                setattr(self, kind, TimedTransform(transform, self.stats, kind))
+
+        self.stats.enabled = True
+        try:
+            yield self.stats
+        finally:
+            self.stats.enabled = False
+            for kind, transform in wrapped.items():
+                setattr(self, kind, transform)
+
+    @contextmanager
+    def _untransformed(self):
+        """ Set aside the transforms of the dataset, and of the dataset it wraps """
+        saved = []
+        dataset = self
+        while dataset is not None:
+            for kind in TRANSFORMS:
+                transform = getattr(dataset, kind, None)
+                if transform is not None:
+                    saved.append((dataset, kind, transform))
+                    setattr(dataset, kind, None)
+            dataset = getattr(dataset, 'dataset', None)
+
+        try:
+            yield
+        finally:
+            for dataset, kind, transform in saved:
+                setattr(dataset, kind, transform)
+
     def on_epoch_end(self):
         """ Keras method called at the end of every epoch. """
         pass
@@ -47,45 +244,175 @@ class InMemoryDataset(Dataset):
         """ Load data and labels """
         raise NotImplementedError
 
+    def load_labels(self):
+        """Load only the labels.
+
+        Subclasses should override this so that code which only needs
+        the labels, such as the stratified splitters, never has to
+        materialize the feature data.
+        """
+        return self.load_data()[1]
+
+    def share_memory(self):
+        """Move the arrays and tensors of the dataset into shared memory.
+
+        Pickled copies of the dataset, such as those sent to worker
+        processes, then attach to the same blocks by name instead of
+        carrying their own copy of the data.
+
+        Returns
+        -------
+        The dataset itself.
+        """
+        for name, value in list(vars(self).items()):
+            setattr(self, name, share(value))
+        return self
+
+    def release_memory(self):
+        """ Release the shared memory blocks created by `share_memory` """
+        for value in vars(self).values():
+            release(value)
+
     def dataframe(self):
         """ Load the data as a pd.DataFrame """
         data, labels = self.load_data()
+        return _frame(data, labels)
 
-        if isinstance(labels, dict):
-            # We are in the multitask case
-            data_dict = {'data': data}
-            for key, value in labels.items():
-                data_dict[key] = value
-        else:
-            data_dict = {'data': data, 'labels': labels}
+    def iter_dataframes(self, chunksize=10000):
+        """Iterate over the data as pd.DataFrames of `chunksize` rows.
 
-        return pd.DataFrame(data_dict)
+        Each chunk is fetched on its own with `get_batch`, so peak memory
+        is bounded by the chunk size rather than the dataset, whatever the
+        dataset and its storage. Like `dataframe`, the frames hold the data
+        before any transform.
 
-    def to_csv(self, path):
-        """ Save the data to disk """
-        self.dataframe().to_csv(path, index=False)
+        Parameters
+        ----------
+        chunksize : int
+            Number of rows in each frame.
+        """
+        for start in range(0, len(self), chunksize):
+            stop = min(start + chunksize, len(self))
+            with self._untransformed():
+                data, labels = self.get_batch(np.arange(start, stop))
+            yield _frame(data, labels, start)
+
+    def to_csv(self, path, chunksize=None):
+        """Save the data to disk
+
+        Parameters
+        ----------
+        path : str
+            Path to the csv file.
 
-    def load_cached(self, path):
-        """ Load the data from disk """
-        frame = pd.read_csv(path)
+        chunksize : int, optional
+            If given, write the file `chunksize` rows at a time.
+        """
+        if chunksize is None:
+            self.dataframe().to_csv(path, index=False)
+            return
+
+        for i, frame in enumerate(self.iter_dataframes(chunksize)):
+            frame.to_csv(path, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+
+    def to_cache(self, path):
+        """Save the data to disk in the binary columnar cache format.
+
+        Unlike `to_csv`, dtypes, shapes and multitask label keys are kept
+        exactly, and the cache can be reloaded column by column or
+        memory-mapped with `load_cached`.
+        """
+        data, labels = self.load_data()
+        write_columnar(path, data, labels)
+
+    def load_cached(self, path, columns=None, mmap=False):
+        """Load the data from disk
+
+        Parameters
+        ----------
+        path : str
+            A binary cache directory written by `to_cache`, or a csv
+            file written by `to_csv`.
+
+        columns : list of str, optional
+            Columns to load. Defaults to all of them.
+
+        mmap : bool
+            Memory-map the columns of a binary cache.
+
+        Returns
+        -------
+        data, labels : tuple
+            The loaded data, also set as `self.data` and `self.labels`.
+        """
+        if is_columnar(path):
+            self.data, self.labels = read_columnar(path, columns=columns, mmap=mmap)
+            return self.data, self.labels
+
+        import pandas as pd
+        frame = pd.read_csv(path, usecols=columns)
 
         self.data = frame.pop('data')
 
         if len(frame.columns) > 1:
-            self.labels = frame.to_dict()
+            # One array per task, so the labels go into a LabelStore
+            self.labels = {key: frame[key].to_numpy() for key in frame}
         else:
             self.labels = frame['labels']
 
+        return self.data, self.labels
+
+    @staticmethod
+    def iter_cached(path, chunksize=10000, columns=None):
+        """Iterate over cached data as pd.DataFrames of `chunksize` rows.
 
-class MultiTaskMeta(type):
-    """ Metaclass for Multitask Datasets """
+        Parameters
+        ----------
+        path : str
+            A binary cache directory written by `to_cache`, or a csv
+            file written by `to_csv`.
+
+        chunksize : int
+            Number of rows in each frame.
+
+        columns : list of str, optional
+            Columns to load. Defaults to all of them.
+        """
+        if not is_columnar(path):
+            import pandas as pd
+            yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+            return
+
+        data, labels = read_columnar(path, columns=columns, mmap=True)
+        first = data if data is not None else labels
+        length = len(next(iter(first.values())) if hasattr(first, 'keys') else first)
 
-    def __init__(cls, name, bases, dct):
-        cls.labels = {}
+        for start in range(0, length, chunksize):
+            stop = start + chunksize
+            yield _frame(_chunk(data, start, stop), _chunk(labels, start, stop), start)
 
 
-class MultiTaskDataset(Dataset, metaclass=MultiTaskMeta):
-    """ Abstract class for multitask datasets """
+class MultiTaskDataset(Dataset):
+    """Abstract class for multitask datasets
+
+    Labels are held in a `LabelStore` owned by each instance, with one
+    column per task.
+    """
+
+    @property
+    def labels(self):
+        store = self.__dict__.get('_labels')
+        if store is None:
+            store = self.__dict__['_labels'] = LabelStore()
+        return store
+
+    @labels.setter
+    def labels(self, labels):
+        if hasattr(labels, 'keys') and not isinstance(labels, LabelStore):
+            # Only per-task arrays fit in a store, e.g. not nested dicts
+            if not any(hasattr(labels[key], 'keys') for key in labels.keys()):
+                labels = LabelStore(labels)
+        self.__dict__['_labels'] = labels
 
     def get_tasks(self):
         return self.labels.keys()
@@ -97,8 +424,8 @@ class MultiTaskDataset(Dataset, metaclass=MultiTaskMeta):
         del self.labels[label]
 
     def index_labels(self, idx):
-        """ Index into the labels """
-        return {key: value[idx] for key, value in self.labels.items()}
+        """ Index into the labels of every task at once """
+        return self.labels.gather(idx)
 
 
 class Subset(InMemoryDataset):
@@ -109,16 +436,37 @@ class Subset(InMemoryDataset):
     dataset (Dataset): The whole Dataset
 
     indices (sequence): Indices in the whole set selected for subset
+
+    A subset of a subset is collapsed into a single subset of the
+    underlying dataset, so nested splits cost one hop per access.
     """
     def __init__(self, dataset, indices):
+        if isinstance(dataset, Subset):
+            indices = dataset.indices[np.asarray(indices, dtype=np.intp)]
+            dataset = dataset.dataset
+
         self.dataset = dataset
-        self.indices = indices
+        self.indices = index_array(indices, len(dataset))
 
     def __getitem__(self, idx):
         return self.dataset[self.indices[idx]]
 
+    def get_batch(self, indices):
+        return self.dataset.get_batch(self.indices[indices])
+
     def __len__(self):
         return len(self.indices)
 
     def load_data(self):
-        return self.dataset[self.indices]
+        # The data as stored, like the `load_data` of other datasets
+        with self._untransformed():
+            return self.dataset.get_batch(self.indices)
+
+    def load_labels(self):
+        if not isinstance(self.dataset, InMemoryDataset):
+            return self.load_data()[1]
+
+        labels = self.dataset.load_labels()
+        if hasattr(labels, 'keys'):
+            return {key: labels[key][self.indices] for key in labels.keys()}
+        return labels[self.indices]
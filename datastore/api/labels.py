@@ -0,0 +1,111 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class LabelStore(MutableMapping):
+    """Labels of several tasks, stored as the columns of one 2-D array.
+
+    Behaves as a dict mapping each task to its labels, where each value is
+    a view of one column. Gathering the labels of a sample or a batch for
+    every task is a single indexing op on the rows of the array.
+
+    Parameters
+    ----------
+    labels : mapping, optional
+        Initial labels of each task, all of the same length.
+
+    dtype : dtype, optional
+        Dtype of the array. By default the common dtype of the labels,
+        widened as tasks are added.
+    """
+
+    def __init__(self, labels=None, dtype=None):
+        self.array = None
+        self.columns = {}
+        self.dtype = None if dtype is None else np.dtype(dtype)
+
+        if labels:
+            tasks = list(labels.keys())
+            columns = [np.asarray(labels[task]) for task in tasks]
+            self.array = np.stack(columns, axis=1)
+            if self.dtype is not None:
+                self.array = self.array.astype(self.dtype, copy=False)
+            self.columns = {task: col for col, task in enumerate(tasks)}
+
+    @property
+    def num_samples(self):
+        return 0 if self.array is None else len(self.array)
+
+    def __getitem__(self, task):
+        return self.array[:, self.columns[task]]
+
+    def __setitem__(self, task, values):
+        values = np.asarray(values)
+        if values.ndim != 1:
+            raise ValueError('Labels of a task must be one dimensional.')
+        if self.array is not None and len(values) != self.num_samples:
+            raise ValueError(f'Expected {self.num_samples} labels for task '
+                             f'{task!r}, got {len(values)}.')
+
+        if self.array is None:
+            dtype = self.dtype or values.dtype
+            self.array = values.astype(dtype, copy=True).reshape(-1, 1)
+            self.columns[task] = 0
+            return
+
+        array = np.asarray(self.array)
+        dtype = self.dtype or np.result_type(array.dtype, values.dtype)
+        if task in self.columns and array.dtype == dtype and array.flags.writeable:
+            array[:, self.columns[task]] = values
+            self.array = array
+        elif task in self.columns:
+            array = array.astype(dtype)
+            array[:, self.columns[task]] = values
+            self.array = array
+        else:
+            # A new task, grow the array by one column
+            grown = np.empty((len(array), array.shape[1] + 1), dtype=dtype)
+            grown[:, :-1] = array
+            grown[:, -1] = values
+            self.array = grown
+            self.columns[task] = array.shape[1]
+
+    def __delitem__(self, task):
+        col = self.columns.pop(task)
+        if not self.columns:
+            self.array = None
+            return
+
+        self.array = np.delete(np.asarray(self.array), col, axis=1)
+        self.columns = {
+            key: index - (index > col) for key, index in self.columns.items()
+        }
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def gather(self, idx):
+        """Labels of every task at `idx`.
+
+        Parameters
+        ----------
+        idx : int, slice or array of int
+            Samples to gather.
+
+        Returns
+        -------
+        dict mapping each task to its labels at `idx`, from a single
+        gather of the rows.
+        """
+        rows = self.array[idx]
+        if rows.ndim == 1:
+            return {task: rows[col] for task, col in self.columns.items()}
+        return {task: rows[:, col] for task, col in self.columns.items()}
+
+    def __repr__(self):
+        return f'LabelStore(tasks={list(self.columns)}, num_samples={self.num_samples})'
+
@@ -0,0 +1,168 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+
+# Dataset held by each worker process of a process pool
+_worker_dataset = None
+
+
+def _init_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+def _worker_fetch(indices):
+    return _worker_dataset.get_batch(indices)
+
+
+class BatchLoader:
+    """Batch iterator over a `Dataset` with background prefetching.
+
+    Batches are gathered with `Dataset.get_batch`. The loader follows the
+    Keras `Sequence` protocol (`__len__`, `__getitem__` and `on_epoch_end`)
+    and can also be iterated over directly, in which case the next batches
+    are fetched by a pool of workers while the current one is being used.
+
+    Parameters
+    ----------
+    dataset : datastore.api.Dataset
+        Dataset to load batches from.
+
+    batch_size : int
+        Number of samples per batch.
+
+    shuffle : bool
+        If true, the order of the samples is reshuffled every epoch.
+
+    seed : int, optional
+        Random seed of the shuffling. The order of each epoch only depends
+        on `seed` and the epoch number.
+
+    drop_last : bool
+        If true, drop the last batch when it is smaller than `batch_size`.
+
+    num_workers : int
+        Number of workers fetching batches in the background. Zero fetches
+        each batch in the calling thread when it is requested.
+
+    prefetch : int
+        Number of batches queued ahead per worker.
+
+    executor : str
+        Either 'thread', suited to memory-mapped and NumPy paths that release
+        the GIL, or 'process', suited to Python-heavy transforms. Process
+        workers receive a pickled copy of the dataset once.
+    """
+
+    def __init__(self, dataset, batch_size=32, shuffle=True, seed=None,
+                 drop_last=False, num_workers=0, prefetch=2, executor='thread'):
+        if executor not in ('thread', 'process'):
+            raise ValueError("Executor must either be 'thread' or 'process'.")
+
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.drop_last = drop_last
+        self.num_workers = num_workers
+        self.prefetch = prefetch
+        self.executor = executor
+        self.epoch = 0
+        self.order = self._epoch_order()
+        self._pool = None
+
+    def _epoch_order(self):
+        """ Order of the samples for the current epoch """
+        if not self.shuffle:
+            return np.arange(len(self.dataset))
+
+        rng = np.random.default_rng([self.seed, self.epoch])
+        return rng.permutation(len(self.dataset))
+
+    def __len__(self):
+        """ Number of batches per epoch """
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return -(-len(self.dataset) // self.batch_size)
+
+    def batch_indices(self, idx):
+        """ Dataset indices of the batch at position `idx` """
+        return self.order[idx * self.batch_size:(idx + 1) * self.batch_size]
+
+    def __getitem__(self, idx):
+        """ Gets batch at position `idx` """
+        if not 0 <= idx < len(self):
+            raise IndexError('Batch index out of range')
+        return self.dataset.get_batch(self.batch_indices(idx))
+
+    def on_epoch_end(self):
+        """ Reshuffle for the next epoch and notify the dataset """
+        self.epoch += 1
+        self.order = self._epoch_order()
+        self.dataset.on_epoch_end()
+
+    @property
+    def pool(self):
+        """ Worker pool, created on first use and kept across epochs """
+        if self._pool is None:
+            if self.executor == 'thread':
+                self._pool = ThreadPoolExecutor(self.num_workers)
+            else:
+                self._pool = ProcessPoolExecutor(
+                    self.num_workers, initializer=_init_worker, initargs=(self.dataset,)
+                )
+        return self._pool
+
+    def _submit(self, idx):
+        indices = self.batch_indices(idx)
+        if self.executor == 'thread':
+            return self.pool.submit(self.dataset.get_batch, indices)
+        return self.pool.submit(_worker_fetch, indices)
+
+    def __iter__(self):
+        """Iterate over the batches of one epoch.
+
+        A full pass ends the epoch by calling `on_epoch_end`.
+        """
+        if not self.num_workers:
+            for idx in range(len(self)):
+                yield self[idx]
+        else:
+            pending = deque()
+            batches = iter(range(len(self)))
+            try:
+                for idx in islice(batches, self.prefetch * self.num_workers):
+                    pending.append(self._submit(idx))
+
+                while pending:
+                    batch = pending.popleft().result()
+                    # Keep the queue full before handing the batch over
+                    idx = next(batches, None)
+                    if idx is not None:
+                        pending.append(self._submit(idx))
+                    yield batch
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        self.on_epoch_end()
+
+    def close(self):
+        """ Shut down the worker pool """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(batch_size={self.batch_size}, '
+                f'shuffle={self.shuffle}, num_workers={self.num_workers}, '
+                f'executor={self.executor!r})')
@@ -0,0 +1,159 @@
+import sys
+import weakref
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from datastore.api.labels import LabelStore
+
+
+def _is_tensor(value):
+    torch = sys.modules.get('torch')
+    return torch is not None and isinstance(value, torch.Tensor)
+
+
+def _attach(name):
+    """ Attach to an existing block without taking ownership of it """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _release(shm, unlink):
+    try:
+        shm.close()
+    except BufferError:
+        # Arrays still view the block, the mapping goes away with them
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedArray:
+    """Array stored in a `multiprocessing.shared_memory` block.
+
+    Pickling a `SharedArray` only sends the name, shape and dtype of its
+    block, and unpickling attaches to the same memory, so worker processes
+    and pickled `Subset`s all read one copy of the data. The process that
+    created the block owns it and unlinks it on `release`, when the array is
+    garbage collected, or at interpreter exit, whichever comes first.
+
+    Parameters
+    ----------
+    name : str
+        Name of an existing shared memory block.
+
+    shape : tuple
+        Shape of the array.
+
+    dtype : str
+        Dtype of the array.
+
+    kind : str
+        'numpy' or 'torch'. Torch arrays are indexed as tensors.
+    """
+
+    def __init__(self, name, shape, dtype, kind='numpy'):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.kind = kind
+        self.owner = False
+        self._shm = _attach(name)
+        self._finalizer = weakref.finalize(self, _release, self._shm, False)
+
+    @classmethod
+    def from_array(cls, value):
+        """Copy an array or tensor into a new shared memory block.
+
+        Returns
+        -------
+        SharedArray owning the new block.
+        """
+        kind = 'torch' if _is_tensor(value) else 'numpy'
+        array = value.numpy() if kind == 'torch' else np.asarray(value)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+
+        shared = cls.__new__(cls)
+        shared.name = shm.name
+        shared.shape = array.shape
+        shared.dtype = array.dtype
+        shared.kind = kind
+        shared.owner = True
+        shared._shm = shm
+        shared._finalizer = weakref.finalize(shared, _release, shm, True)
+        return shared
+
+    @property
+    def array(self):
+        """ NumPy view of the shared block """
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        item = self.array[idx]
+        if self.kind == 'torch':
+            import torch
+            return torch.as_tensor(item)
+        return item
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def numpy(self):
+        return self.array
+
+    def __reduce__(self):
+        return SharedArray, (self.name, self.shape, self.dtype.str, self.kind)
+
+    def release(self):
+        """ Detach from the block, and unlink it if this process owns it """
+        self._finalizer()
+
+    def __repr__(self):
+        return f'SharedArray({self.name!r}, shape={self.shape}, dtype={self.dtype})'
+
+
+def share(value):
+    """ Recursively move arrays and tensors into shared memory blocks """
+    if isinstance(value, np.ndarray) or _is_tensor(value):
+        return SharedArray.from_array(value)
+    if isinstance(value, dict):
+        return {key: share(item) for key, item in value.items()}
+    if isinstance(value, LabelStore) and value.array is not None:
+        store = LabelStore(dtype=value.dtype)
+        store.array = SharedArray.from_array(value.array)
+        store.columns = dict(value.columns)
+        return store
+    if hasattr(value, 'share_memory') and hasattr(value, 'load_data'):
+        return value.share_memory()
+    return value
+
+
+def release(value):
+    """ Recursively release the shared memory blocks held by `value` """
+    if isinstance(value, SharedArray):
+        value.release()
+    elif isinstance(value, dict):
+        for item in value.values():
+            release(item)
+    elif isinstance(value, LabelStore):
+        release(value.array)
+    elif hasattr(value, 'release_memory') and hasattr(value, 'load_data'):
+        value.release_memory()
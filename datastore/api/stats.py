@@ -0,0 +1,210 @@
+"""
+Opt-in instrumentation of dataset access.
+
+`Dataset.instrument` attaches a `DatasetStats` to a dataset and times every
+`__getitem__` and `get_batch` call, separating the time spent in
+`transform` and `target_transform` from the time spent fetching the
+samples. Every other dataset keeps its direct call path, behind a single
+attribute check.
+"""
+import functools
+import threading
+
+from time import perf_counter
+
+
+TRANSFORMS = ('transform', 'target_transform')
+
+
+def sample_nbytes(value):
+    """ Size in bytes of the arrays and tensors in a sample or batch """
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if hasattr(value, 'element_size'):
+        return value.element_size() * value.nelement()
+    if isinstance(value, dict):
+        return sum(sample_nbytes(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(sample_nbytes(item) for item in value)
+    return 0
+
+
+class DatasetStats:
+    """Counters of the accesses to one dataset.
+
+    Attributes
+    ----------
+    fetch_calls : int
+        Number of `__getitem__` and `get_batch` calls.
+
+    samples : int
+        Number of samples returned by those calls.
+
+    fetch_time : float
+        Seconds spent in those calls, excluding transforms.
+
+    bytes_read : int
+        Size of the arrays and tensors fetched, before any transform, e.g.
+        the uint8 images read rather than the floats they are converted to.
+
+    transform_calls, transform_time : dict
+        Number of calls to, and seconds spent in, `transform` and
+        `target_transform`.
+
+    cache_hits, cache_misses : int
+        Lookups reported by caching layers with `record_cache`.
+
+    Only accesses made in the process holding the stats are counted,
+    worker processes receive their own copy.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """ Set every counter back to zero """
+        with self._lock:
+            self.fetch_calls = 0
+            self.samples = 0
+            self.fetch_time = 0.0
+            self.bytes_read = 0
+            self.transform_calls = dict.fromkeys(TRANSFORMS, 0)
+            self.transform_time = dict.fromkeys(TRANSFORMS, 0.0)
+            self.cache_hits = 0
+            self.cache_misses = 0
+
+    def measure(self, method, dataset, idx, samples):
+        """ Call `method(dataset, idx)`, recording it as a fetch of `samples` """
+        local = self._local
+        if getattr(local, 'depth', 0):
+            # Nested access, e.g. the default `get_batch` calling
+            # `__getitem__`, is part of the outer fetch
+            return method(dataset, idx)
+
+        local.depth = 1
+        local.transform_time = 0.0
+        # Bytes added by transforms, which were not read
+        local.transform_bytes = 0
+        start = perf_counter()
+        try:
+            result = method(dataset, idx)
+        finally:
+            local.depth = 0
+        elapsed = perf_counter() - start
+
+        nbytes = sample_nbytes(result) - local.transform_bytes
+        with self._lock:
+            self.fetch_calls += 1
+            self.samples += samples
+            self.fetch_time += elapsed - local.transform_time
+            self.bytes_read += nbytes
+        return result
+
+    def record_transform(self, kind, seconds, nbytes_in=0, nbytes_out=0):
+        """Record one call to `transform` or `target_transform`
+
+        `nbytes_in` and `nbytes_out` are the sizes of its input and output,
+        so the bytes read by a fetch exclude what the transform added.
+        """
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.transform_time += seconds
+            local.transform_bytes += nbytes_out - nbytes_in
+        with self._lock:
+            self.transform_calls[kind] += 1
+            self.transform_time[kind] += seconds
+
+    def record_cache(self, hit):
+        """ Record a lookup in a cache in front of the dataset """
+        if not self.enabled:
+            return
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def as_dict(self):
+        """ Export the counters, and rates derived from them, as a flat dict """
+        with self._lock:
+            stats = {
+                'fetch_calls': self.fetch_calls,
+                'samples': self.samples,
+                'fetch_time': self.fetch_time,
+                'bytes_read': self.bytes_read,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+            }
+            for kind in TRANSFORMS:
+                stats[f'{kind}_calls'] = self.transform_calls[kind]
+                stats[f'{kind}_time'] = self.transform_time[kind]
+
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        stats['cache_hit_rate'] = stats['cache_hits'] / lookups if lookups else None
+        stats['fetch_time_per_sample'] = (
+            stats['fetch_time'] / stats['samples'] if stats['samples'] else None
+        )
+        return stats
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock'], state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __repr__(self):
+        return (f'DatasetStats(fetch_calls={self.fetch_calls}, samples={self.samples}, '
+                f'fetch_time={self.fetch_time:.4f}, bytes_read={self.bytes_read})')
+
+
+class TimedTransform:
+    """ Wraps a transform to record its calls in a `DatasetStats` """
+
+    def __init__(self, transform, stats, kind):
+        self.transform = transform
+        self.stats = stats
+        self.kind = kind
+        self.batched = getattr(transform, 'batched', False)
+        if hasattr(transform, 'map_batch'):
+            self.map_batch = self._map_batch
+
+    def _timed(self, func, value):
+        start = perf_counter()
+        result = None
+        try:
+            result = func(value)
+            return result
+        finally:
+            seconds = perf_counter() - start
+            self.stats.record_transform(self.kind, seconds, sample_nbytes(value),
+                                        sample_nbytes(result))
+
+    def _map_batch(self, batch):
+        return self._timed(self.transform.map_batch, batch)
+
+    def __call__(self, value):
+        return self._timed(self.transform, value)
+
+    def __repr__(self):
+        return repr(self.transform)
+
+
+def instrumented(method, batched):
+    """ Wrap a `__getitem__` or `get_batch` implementation """
+
+    @functools.wraps(method)
+    def wrapper(self, idx):
+        stats = self.stats
+        if stats is None or not stats.enabled:
+            return method(self, idx)
+        return stats.measure(method, self, idx, len(idx) if batched else 1)
+
+    wrapper.__instrumented__ = True
+    return wrapper
@@ -0,0 +1,205 @@
+"""
+Composable transforms for `transform` and `target_transform`.
+
+A stage with ``batched = True`` works on whole batches as well as single
+samples, so `Dataset.get_batch` calls it once on the gathered batch
+instead of once per sample. Any other callable is still applied sample by
+sample. `Compose` runs each of its stages on the batch the best way that
+stage allows.
+
+    >>> transform = Compose([ToFloat(scale=1 / 255), Clip(0, 1)])
+    >>> dataset = KuzushijiMNIST(root, 'train', transform=transform)
+"""
+import numpy as np
+
+from datastore.api.data import Dataset
+
+
+def _is_tensor(value):
+    return type(value).__module__.startswith('torch')
+
+
+class Transform:
+    """Base class of transform stages.
+
+    Subclasses implement `__call__` and set `batched` if it also applies
+    to a batch of samples stacked along the first axis.
+    """
+
+    batched = False
+
+    def __call__(self, value):
+        raise NotImplementedError
+
+    def map_batch(self, batch):
+        """ Apply the transform across a gathered batch """
+        if self.batched:
+            return self(batch)
+        return Dataset._map_batch(self.__call__, batch)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class Compose(Transform):
+    """Chain several transforms.
+
+    Parameters
+    ----------
+    transforms : list of callable
+        Stages applied in order.
+    """
+
+    def __init__(self, transforms):
+        self.transforms = list(transforms)
+        self.batched = all(getattr(stage, 'batched', False) for stage in self.transforms)
+
+    def __call__(self, value):
+        for stage in self.transforms:
+            value = stage(value)
+        return value
+
+    def map_batch(self, batch):
+        # Batched stages run once on the batch, the others sample by sample
+        for stage in self.transforms:
+            batch = Dataset._map_batch(stage, batch)
+        return batch
+
+    def __repr__(self):
+        stages = ', '.join(repr(stage) for stage in self.transforms)
+        return f'Compose([{stages}])'
+
+
+class Lambda(Transform):
+    """Use a function as a transform stage.
+
+    Parameters
+    ----------
+    func : callable
+        The transform.
+
+    batched : bool
+        Set if `func` also applies to whole batches, e.g. when it only
+        uses elementwise NumPy or torch operations.
+    """
+
+    def __init__(self, func, batched=False):
+        self.func = func
+        self.batched = batched
+
+    def __call__(self, value):
+        return self.func(value)
+
+    def __repr__(self):
+        return f'Lambda({self.func!r}, batched={self.batched})'
+
+
+class ToFloat(Transform):
+    """Convert to floating point, optionally rescaling.
+
+    Parameters
+    ----------
+    scale : float, optional
+        Factor applied after the conversion, e.g. ``1 / 255`` to bring
+        `uint8` images into [0, 1].
+
+    dtype : str
+        Floating point dtype, 'float32' by default.
+    """
+
+    batched = True
+
+    def __init__(self, scale=None, dtype='float32'):
+        self.scale = scale
+        self.dtype = dtype
+
+    def __call__(self, value):
+        if _is_tensor(value):
+            import torch
+            value = value.to(getattr(torch, self.dtype))
+        else:
+            value = np.asarray(value, dtype=self.dtype)
+
+        if self.scale is not None:
+            value = value * self.scale
+        return value
+
+    def __repr__(self):
+        return f'ToFloat(scale={self.scale}, dtype={self.dtype!r})'
+
+
+class Clip(Transform):
+    """Limit values to a range, e.g. token ids to a vocabulary.
+
+    Parameters
+    ----------
+    low, high : scalar, optional
+        Bounds of the range. Either can be None for no bound.
+    """
+
+    batched = True
+
+    def __init__(self, low=None, high=None):
+        self.low = low
+        self.high = high
+
+    def __call__(self, value):
+        if _is_tensor(value):
+            import torch
+            return torch.clamp(value, self.low, self.high)
+        return np.clip(value, self.low, self.high)
+
+    def __repr__(self):
+        return f'Clip({self.low}, {self.high})'
+
+
+class Remap(Transform):
+    """Map integer labels to new values through a lookup table.
+
+    Parameters
+    ----------
+    mapping : dict
+        New value of each non-negative integer label.
+
+    default : scalar, optional
+        Value of labels missing from `mapping`. By default they raise
+        a KeyError.
+    """
+
+    batched = True
+
+    def __init__(self, mapping, default=None):
+        self.mapping = dict(mapping)
+        self.default = default
+
+        keys = np.fromiter(self.mapping.keys(), dtype=np.int64, count=len(self.mapping))
+        values = np.array(list(self.mapping.values()))
+        if len(keys) and keys.min() < 0:
+            raise ValueError('Remap only supports non-negative integer labels.')
+
+        size = int(keys.max()) + 1 if len(keys) else 0
+        self._known = np.zeros(size, dtype=bool)
+        self._known[keys] = True
+        self._table = np.zeros(size, dtype=values.dtype if len(values) else np.int64)
+        self._table[keys] = values
+
+    def _lookup(self, labels):
+        labels = np.asarray(labels)
+        inside = (labels >= 0) & (labels < len(self._table))
+        clipped = np.where(inside, labels, 0)
+        known = inside & self._known[clipped] if len(self._table) else inside
+
+        if not known.all():
+            if self.default is None:
+                raise KeyError(labels[~known].flat[0].item())
+            return np.where(known, self._table[clipped], self.default)
+        return self._table[clipped]
+
+    def __call__(self, value):
+        if _is_tensor(value):
+            import torch
+            return torch.from_numpy(np.asarray(self._lookup(value.numpy())))
+        return self._lookup(value)
+
+    def __repr__(self):
+        return f'Remap({self.mapping!r}, default={self.default!r})'
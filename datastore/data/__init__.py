@@ -1,4 +1,27 @@
-from .p3b3 import P3B3
-from .uno import Uno
-from .kuzushiji import KuzushijiMNIST
-from .random import RandomData, RandomMultiTaskData
+import importlib
+
+
+# Datasets are imported on first access (PEP 562)
+_DATASETS = {
+    'P3B3': '.p3b3',
+    'Uno': '.uno',
+    'KuzushijiMNIST': '.kuzushiji',
+    'RandomData': '.random',
+    'RandomMultiTaskData': '.random',
+    'SyntheticData': '.synthetic',
+    'SyntheticMultiTaskData': '.synthetic',
+}
+
+__all__ = list(_DATASETS)
+
+
+def __getattr__(name):
+    if name in _DATASETS:
+        value = getattr(importlib.import_module(_DATASETS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,9 +1,12 @@
 import os
+import shutil
+import zipfile
 import numpy as np
 
 from datastore.api import InMemoryDataset
+from datastore.api.arrays import MemmapArray
 from datastore.utils.utils import (
-    download_url, makedir_exist_ok
+    CHUNK_SIZE, download_urls, makedir_exist_ok, timed
 )
 
 
@@ -20,10 +23,23 @@ class KuzushijiMNIST(InMemoryDataset):
         dataset partition to be loaded.
         Either 'train', 'validation', or 'test'.
 
+    transform : callable, optional
+        Applied to each image. Stages from `datastore.api.transforms`
+        marked `batched`, e.g. ``ToFloat(scale=1 / 255)``, run once per
+        batch in `get_batch`.
+
+    target_transform : callable, optional
+        Applied to each label.
+
     download : bool, optional
         If true, downloads the dataset from the internet and
         puts it in root directory. If dataset is already downloaded, it is not
         downloaded again.
+
+    mmap : bool, optional
+        If true, the processed arrays are memory-mapped and only opened on
+        first access. Pickled copies reopen the files instead of carrying
+        the data, so DataLoader workers share one page-cache copy.
     """
     urls = [
         'https://raw.githubusercontent.com/yngtodd/kmnist/master/data/kmnist/kmnist-train-imgs.npz',
@@ -32,16 +48,21 @@ class KuzushijiMNIST(InMemoryDataset):
         'https://raw.githubusercontent.com/yngtodd/kmnist/master/data/kmnist/kmnist-test-labels.npz'
     ]
 
+    # Expected digests of the raw files, as 'algorithm:hexdigest' keyed
+    # by filename. Files without an entry are not verified.
+    checksums = {}
+
     training_data_file = 'train_data.npy'
     training_label_file = 'train_labels.npy'
     test_data_file = 'test_data.npy'
     test_label_file = 'test_labels.npy'
 
     def __init__(self, root, partition, transform=None,
-                 target_transform=None, download=False):
+                 target_transform=None, download=False, mmap=False):
         self.root = os.path.expanduser(root)
         self.transform = transform
         self.target_transform = target_transform
+        self.mmap = mmap
 
         if download:
             self.download()
@@ -60,7 +81,7 @@ class KuzushijiMNIST(InMemoryDataset):
         else:
             raise ValueError("Partition must either be 'train' or 'test'.")
 
-        self.data = np.load(os.path.join(self.processed_folder, data_file))
+        self.data = self.load_array(data_file)
         self.targets = self.get_targets(label_file)
 
     def __len__(self):
@@ -69,9 +90,19 @@ class KuzushijiMNIST(InMemoryDataset):
     def load_data(self):
         return self.data, self.targets
 
+    def load_labels(self):
+        return self.targets
+
+    def load_array(self, filename):
+        """Load a processed array, memory-mapped if `mmap` was requested."""
+        path = os.path.join(self.processed_folder, filename)
+        if self.mmap:
+            return MemmapArray(path)
+        return np.load(path)
+
     def get_targets(self, label_file):
         """Get dictionary of targets specified by user."""
-        targets = np.load(os.path.join(self.processed_folder, label_file))
+        targets = self.load_array(label_file)
         return targets
 
     def __getitem__(self, idx):
@@ -96,6 +127,30 @@ class KuzushijiMNIST(InMemoryDataset):
 
         return imgs, targets
 
+    def get_batch(self, indices):
+        """
+        Parameters
+        ----------
+        indices : sequence of int
+          Indices of the data to be loaded.
+
+        Returns
+        -------
+        (imgs, targets) : tuple
+           where imgs is stacked along the first axis and targets holds
+           the index of the target class of each image.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        imgs, targets = self.data[indices], self.targets[indices]
+
+        if self.transform is not None:
+            imgs = self._map_batch(self.transform, imgs)
+
+        if self.target_transform is not None:
+            targets = self._map_batch(self.target_transform, targets)
+
+        return imgs, targets
+
     @property
     def raw_folder(self):
         return os.path.join(self.root, self.__class__.__name__, 'raw')
@@ -111,13 +166,21 @@ class KuzushijiMNIST(InMemoryDataset):
                os.path.exists(os.path.join(self.processed_folder, self.test_label_file))
 
     @staticmethod
-    def extract_array(path, remove_finished=False):
+    def extract_array(path, out_path, remove_finished=False):
+        """Stream the array of an `.npz` archive straight into a `.npy` file.
+
+        Archive members are `.npy` files already, so the member is only
+        decompressed once, chunk by chunk, and never held in memory whole.
+        """
         print('Extracting {}'.format(path))
-        with np.load(path) as data:
-            arry = data['arr_0']
+        tmp_path = out_path + '.tmp'
+        with zipfile.ZipFile(path) as archive:
+            with archive.open('arr_0.npy') as member, open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(member, f, CHUNK_SIZE)
+        # Only complete files end up in the processed folder
+        os.replace(tmp_path, out_path)
         if remove_finished:
             os.unlink(path)
-        return arry
 
     def download(self):
         """Download the Synthetic data if it doesn't exist in processed_folder already."""
@@ -128,36 +191,28 @@ class KuzushijiMNIST(InMemoryDataset):
         makedir_exist_ok(self.raw_folder)
         makedir_exist_ok(self.processed_folder)
 
+        self.timings = {}
+
         # download files
-        for url in self.urls:
-            filename = url.rpartition('/')[2]
-            file_path = os.path.join(self.raw_folder, filename)
-            download_url(url, root=self.raw_folder, filename=filename, md5=None)
-            _ = self.extract_array(path=file_path, remove_finished=False)
+        with timed('download', self.timings):
+            download_urls(self.urls, root=self.raw_folder, checksums=self.checksums)
 
         # process and save as numpy files
         print('Processing...')
 
-        training_set = (
-            self.extract_array(os.path.join(self.raw_folder, 'kmnist-train-imgs.npz')),
-            self.extract_array(os.path.join(self.raw_folder, 'kmnist-train-labels.npz'))
-        )
-        test_set = (
-            self.extract_array(os.path.join(self.raw_folder, 'kmnist-test-imgs.npz')),
-            self.extract_array(os.path.join(self.raw_folder, 'kmnist-test-labels.npz'))
-        )
-
-        # Save processed training data
-        train_data_path = os.path.join(self.processed_folder, self.training_data_file)
-        np.save(train_data_path, training_set[0])
-        train_label_path = os.path.join(self.processed_folder, self.training_label_file)
-        np.save(train_label_path, training_set[1])
-
-        # Save processed test data
-        test_data_path = os.path.join(self.processed_folder, self.test_data_file)
-        np.save(test_data_path, test_set[0])
-        test_label_path = os.path.join(self.processed_folder, self.test_label_file)
-        np.save(test_label_path, test_set[1])
+        processed = [
+            ('kmnist-train-imgs.npz', self.training_data_file),
+            ('kmnist-train-labels.npz', self.training_label_file),
+            ('kmnist-test-imgs.npz', self.test_data_file),
+            ('kmnist-test-labels.npz', self.test_label_file),
+        ]
+
+        with timed('processing', self.timings):
+            for raw_file, processed_file in processed:
+                self.extract_array(
+                    os.path.join(self.raw_folder, raw_file),
+                    os.path.join(self.processed_folder, processed_file)
+                )
 
         print('Done!')
 
@@ -2,8 +2,9 @@ import os
 import numpy as np
 
 from datastore.api import InMemoryDataset
+from datastore.api.arrays import MemmapArray
 from datastore.utils.utils import (
-    download_url, makedir_exist_ok
+    download_urls, link_or_copy, makedir_exist_ok, timed
 )
 
 
@@ -24,6 +25,11 @@ class P3B3(InMemoryDataset):
         If true, downloads the dataset from the internet and
         puts it in root directory. If dataset is already downloaded, it is not
         downloaded again.
+
+    mmap : bool, optional
+        If true, the processed arrays are memory-mapped and only opened on
+        first access. Pickled copies reopen the files instead of carrying
+        the data, so DataLoader workers share one page-cache copy.
     """
     urls = [
         'https://raw.githubusercontent.com/yngtodd/unlp/master/p3b3/train-data.npy',
@@ -32,6 +38,10 @@ class P3B3(InMemoryDataset):
         'https://raw.githubusercontent.com/yngtodd/unlp/master/p3b3/test-labels.npy'
     ]
 
+    # Expected digests of the raw files, as 'algorithm:hexdigest' keyed
+    # by filename. Files without an entry are not verified.
+    checksums = {}
+
     training_data_file = 'train_data.npy'
     training_label_file = 'train_labels.npy'
     test_data_file = 'test_data.npy'
@@ -39,10 +49,12 @@ class P3B3(InMemoryDataset):
 
     def __init__(self, root, partition, subsite=True,
                  laterality=True, behavior=True, grade=True,
-                 transform=None, target_transform=None, download=False):
+                 transform=None, target_transform=None, download=False,
+                 mmap=False):
         self.root = os.path.expanduser(root)
         self.transform = transform
         self.target_transform = target_transform
+        self.mmap = mmap
         self.subsite = subsite
         self.laterality = laterality
         self.behavior = behavior
@@ -65,7 +77,7 @@ class P3B3(InMemoryDataset):
         else:
             raise ValueError("Partition must either be 'train' or 'test'.")
 
-        self.data = np.load(os.path.join(self.processed_folder, data_file))
+        self.data = self.load_array(data_file)
         self.targets = self.get_targets(label_file)
 
     def __len__(self):
@@ -74,19 +86,34 @@ class P3B3(InMemoryDataset):
     def load_data(self):
         return self.data, self.targets
 
+    def load_labels(self):
+        return self.targets
+
+    def load_array(self, filename):
+        """Load a processed array, memory-mapped if `mmap` was requested."""
+        path = os.path.join(self.processed_folder, filename)
+        if self.mmap:
+            return MemmapArray(path)
+        return np.load(path)
+
     def get_targets(self, label_file):
         """Get dictionary of targets specified by user."""
-        targets = np.load(os.path.join(self.processed_folder, label_file))
+        targets = self.load_array(label_file)
+
+        if self.mmap:
+            columns = [targets.column(i) for i in range(4)]
+        else:
+            columns = [targets[:, i] for i in range(4)]
 
         tasks = {}
         if self.subsite:
-            tasks['subsite'] = targets[:, 0]
+            tasks['subsite'] = columns[0]
         if self.laterality:
-            tasks['laterality'] = targets[:, 1]
+            tasks['laterality'] = columns[1]
         if self.behavior:
-            tasks['behavior'] = targets[:, 2]
+            tasks['behavior'] = columns[2]
         if self.grade:
-            tasks['grade'] = targets[:, 3]
+            tasks['grade'] = columns[3]
 
         return tasks
 
@@ -118,6 +145,36 @@ class P3B3(InMemoryDataset):
 
         return document, targets
 
+    def get_batch(self, indices):
+        """
+        Parameters
+        ----------
+        indices : sequence of int
+          Indices of the data to be loaded.
+
+        Returns
+        -------
+        (documents, targets) : tuple
+           where documents is stacked along the first axis and targets maps
+           each task to its labels for the batch.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        documents = self.data[indices]
+
+        if self.transform is not None:
+            documents = self._map_batch(self.transform, documents)
+
+        targets = {}
+        for key, value in self.targets.items():
+            subset = value[indices]
+
+            if self.target_transform is not None:
+                subset = self._map_batch(self.target_transform, subset)
+
+            targets[key] = subset
+
+        return documents, targets
+
     @property
     def raw_folder(self):
         return os.path.join(self.root, self.__class__.__name__, 'raw')
@@ -132,13 +189,6 @@ class P3B3(InMemoryDataset):
                os.path.exists(os.path.join(self.processed_folder, self.test_data_file)) and \
                os.path.exists(os.path.join(self.processed_folder, self.test_label_file))
 
-    @staticmethod
-    def extract_array(path, remove_finished=False):
-        print('Extracting {}'.format(path))
-        arry = np.load(path)
-        if remove_finished:
-            os.unlink(path)
-
     def download(self):
         """Download the Synthetic data if it doesn't exist in processed_folder already."""
 
@@ -148,36 +198,28 @@ class P3B3(InMemoryDataset):
         makedir_exist_ok(self.raw_folder)
         makedir_exist_ok(self.processed_folder)
 
+        self.timings = {}
+
         # download files
-        for url in self.urls:
-            filename = url.rpartition('/')[2]
-            file_path = os.path.join(self.raw_folder, filename)
-            download_url(url, root=self.raw_folder, filename=filename, md5=None)
-            self.extract_array(path=file_path, remove_finished=False)
+        with timed('download', self.timings):
+            download_urls(self.urls, root=self.raw_folder, checksums=self.checksums)
 
-        # process and save as numpy files
+        # The raw files are already numpy files, link them into place
         print('Processing...')
 
-        training_set = (
-            np.load(os.path.join(self.raw_folder, 'train-data.npy')),
-            np.load(os.path.join(self.raw_folder, 'train-labels.npy'))
-        )
-        test_set = (
-            np.load(os.path.join(self.raw_folder, 'test-data.npy')),
-            np.load(os.path.join(self.raw_folder, 'test-labels.npy'))
-        )
-
-        # Save processed training data
-        train_data_path = os.path.join(self.processed_folder, self.training_data_file)
-        np.save(train_data_path, training_set[0])
-        train_label_path = os.path.join(self.processed_folder, self.training_label_file)
-        np.save(train_label_path, training_set[1])
-
-        # Save processed test data
-        test_data_path = os.path.join(self.processed_folder, self.test_data_file)
-        np.save(test_data_path, test_set[0])
-        test_label_path = os.path.join(self.processed_folder, self.test_label_file)
-        np.save(test_label_path, test_set[1])
+        processed = [
+            ('train-data.npy', self.training_data_file),
+            ('train-labels.npy', self.training_label_file),
+            ('test-data.npy', self.test_data_file),
+            ('test-labels.npy', self.test_label_file),
+        ]
+
+        with timed('processing', self.timings):
+            for raw_file, processed_file in processed:
+                link_or_copy(
+                    os.path.join(self.raw_folder, raw_file),
+                    os.path.join(self.processed_folder, processed_file)
+                )
 
         print('Done!')
 
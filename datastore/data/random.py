@@ -1,6 +1,4 @@
-import torch
 import numpy as np
-import pandas as pd
 
 from datastore.api import InMemoryDataset, MultiTaskDataset
 
@@ -9,13 +7,16 @@ class RandomData(InMemoryDataset):
     """ Random dataset - Useful for quick iterating """
 
     def __init__(self, num_samples: int, num_classes: int, seed: int=13):
-        np.random.seed(seed)
-        self.data = np.random.randn(num_samples)
-        self.labels = np.random.randint(num_classes, size=num_samples)
+        rng = np.random.RandomState(seed)
+        self.data = rng.randn(num_samples)
+        self.labels = rng.randint(num_classes, size=num_samples)
 
     def load_data(self):
         return self.data, self.labels
 
+    def load_labels(self):
+        return self.labels
+
     def __repr__(self):
         return f'Random supervised dataset'
 
@@ -25,25 +26,35 @@ class RandomData(InMemoryDataset):
     def __getitem__(self, idx):
         return self.data[idx], self.labels[idx]
 
+    def get_batch(self, indices):
+        indices = np.asarray(indices, dtype=np.intp)
+        return self.data[indices], self.labels[indices]
+
 
 class RandomMultiTaskData(InMemoryDataset, MultiTaskDataset):
     """ Random multiclass dataset - Useful for quick iterating """
 
     def __init__(self, num_samples: int, num_tasks: int, num_classes: int, seed: int=13):
-        np.random.seed(seed)
-        self.data = torch.randn([num_samples, 10])
-        self._create_labels(num_tasks, num_classes, num_samples)
-        
-    def _create_labels(self, num_tasks, num_classes, num_samples):
+        import torch
+
+        # A local generator, so the data and labels only depend on `seed`
+        rng = np.random.RandomState(seed)
+        self.data = torch.from_numpy(rng.randn(num_samples, 10).astype(np.float32))
+        self._create_labels(num_tasks, num_classes, num_samples, rng)
+
+    def _create_labels(self, num_tasks, num_classes, num_samples, rng):
         for i in range(num_tasks):
-            self.labels[f'task{i}'] = np.random.randint(
-                num_classes, 
+            self.labels[f'task{i}'] = rng.randint(
+                num_classes,
                 size=num_samples
             )
 
     def load_data(self):
         return self.data, self.labels
 
+    def load_labels(self):
+        return self.labels
+
     def __repr__(self):
         return f'Random multitask supervised dataset'
 
@@ -52,3 +63,7 @@ class RandomMultiTaskData(InMemoryDataset, MultiTaskDataset):
 
     def __getitem__(self, idx):
         return self.data[idx], self.index_labels(idx)
+
+    def get_batch(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        return self.data[indices], self.index_labels(indices)
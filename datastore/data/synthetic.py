@@ -0,0 +1,362 @@
+"""
+Synthetic datasets generated on demand.
+
+Every value is a pure function of ``(seed, stream, sample, position)``,
+computed with the splitmix64 mixing function over a counter. Nothing is
+stored: sample `i` is generated when it is requested, and is the same
+whichever batch it is requested in, in any process. Datasets of any length
+take no memory.
+"""
+from collections.abc import Mapping
+
+import numpy as np
+
+from datastore.api import InMemoryDataset, MultiTaskDataset
+
+
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+# Independent streams of values
+FEATURES = 0
+BOX_MULLER = 1
+LABELS = 2
+
+
+def splitmix64(x):
+    """ The splitmix64 finalizer, applied elementwise to uint64 arrays """
+    # At least 1-D, since only array arithmetic wraps around silently
+    x = np.array(x, dtype=np.uint64, ndmin=1)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def uniform(seed, stream, counters):
+    """Uniform values in [0, 1), one per counter.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the dataset.
+
+    stream : int
+        Independent stream of values to draw from.
+
+    counters : array of int
+        Position of each value in the stream.
+    """
+    key = splitmix64(splitmix64(seed) ^ np.uint64(stream))
+    counters = np.array(counters, dtype=np.uint64, ndmin=1)
+    bits = splitmix64(key + (counters + np.uint64(1)) * GOLDEN)
+    # The top 53 bits fill the mantissa of a double
+    return (bits >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def normal(seed, stream, counters):
+    """ Standard normal values, one per counter, with the Box-Muller transform """
+    radius = np.sqrt(-2.0 * np.log1p(-uniform(seed, stream, counters)))
+    angle = 2.0 * np.pi * uniform(seed, BOX_MULLER + stream, counters)
+    return radius * np.cos(angle)
+
+
+def class_weights(num_classes, imbalance=1.0):
+    """Class probabilities falling geometrically from the first class.
+
+    Parameters
+    ----------
+    num_classes : int
+        Number of classes.
+
+    imbalance : float
+        Ratio of the probabilities of the most and least frequent class.
+        1 gives balanced classes.
+    """
+    if imbalance < 1:
+        raise ValueError('Imbalance must be at least 1.')
+    if num_classes == 1:
+        return np.ones(1)
+    weights = imbalance ** (-np.arange(num_classes) / (num_classes - 1))
+    return weights / weights.sum()
+
+
+class _Synthetic(InMemoryDataset):
+    """ Shared generation of features and labels """
+
+    def _init(self, num_samples, shape, seed, dtype, transform, target_transform):
+        self.num_samples = int(num_samples)
+        self.shape = tuple(shape)
+        self.seed = seed
+        self.dtype = np.dtype(dtype)
+        self.transform = transform
+        self.target_transform = target_transform
+        self.num_features = int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.num_samples
+
+    def _indices(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size and (indices.min() < -self.num_samples or indices.max() >= self.num_samples):
+            raise IndexError('Index out of range')
+        return np.where(indices < 0, indices + self.num_samples, indices)
+
+    def features(self, indices):
+        """ Features of the samples at `indices`, shaped (len(indices),) + shape """
+        counters = indices[:, None] * self.num_features + np.arange(self.num_features)
+        values = normal(self.seed, FEATURES, counters).astype(self.dtype, copy=False)
+        return values.reshape((len(indices),) + self.shape)
+
+    def _labels(self, task, indices, cumulative):
+        """ Labels of one task, drawn with the given cumulative class probabilities """
+        draws = uniform(self.seed, LABELS + task, indices)
+        labels = np.searchsorted(cumulative, draws, side='right')
+        return np.minimum(labels, len(cumulative) - 1)
+
+    def load_data(self):
+        """ Generate the whole dataset. Only use this when it fits in memory """
+        return self.get_batch(np.arange(self.num_samples))
+
+    def __getitem__(self, idx):
+        """
+        Parameters
+        ----------
+        index : int
+          Index of the data to be generated.
+
+        Returns
+        -------
+        (data, target) : tuple
+           where target is the label, or maps each task to its label.
+        """
+        data, labels = self._generate(self._indices([idx]))
+        data = data[0]
+        if hasattr(labels, 'keys'):
+            labels = {key: value[0] for key, value in labels.items()}
+        else:
+            labels = labels[0]
+
+        if self.transform is not None:
+            data = self.transform(data)
+
+        if self.target_transform is not None:
+            if hasattr(labels, 'keys'):
+                labels = {key: self.target_transform(value) for key, value in labels.items()}
+            else:
+                labels = self.target_transform(labels)
+
+        return data, labels
+
+    def get_batch(self, indices):
+        data, labels = self._generate(self._indices(indices))
+
+        if self.transform is not None:
+            data = self._map_batch(self.transform, data)
+
+        if self.target_transform is not None:
+            if hasattr(labels, 'keys'):
+                labels = {key: self._map_batch(self.target_transform, value)
+                          for key, value in labels.items()}
+            else:
+                labels = self._map_batch(self.target_transform, labels)
+
+        return data, labels
+
+
+class SyntheticData(_Synthetic):
+    """Synthetic classification data, generated on demand.
+
+    Features are standard normal and labels follow the class weights.
+    Sample `i` only depends on `seed` and `i`.
+
+    Parameters
+    ----------
+    num_samples : int
+        Length of the dataset. Nothing is stored, so it can be far larger
+        than memory.
+
+    num_classes : int
+        Number of classes.
+
+    shape : tuple
+        Shape of the features of one sample.
+
+    seed : int
+        Seed of the dataset.
+
+    imbalance : float
+        Ratio of the frequencies of the most and least common class.
+
+    weights : sequence of float, optional
+        Class probabilities, overriding `imbalance`.
+
+    dtype : str
+        Dtype of the features.
+
+    transform : callable, optional
+        Applied to each sample of data.
+
+    target_transform : callable, optional
+        Applied to each label.
+    """
+
+    def __init__(self, num_samples, num_classes, shape=(10,), seed=13, imbalance=1.0,
+                 weights=None, dtype='float32', transform=None, target_transform=None):
+        self._init(num_samples, shape, seed, dtype, transform, target_transform)
+        self.num_classes = num_classes
+        self.weights = _weights(num_classes, imbalance, weights)
+        self._cumulative = np.cumsum(self.weights)
+
+    def _generate(self, indices):
+        return self.features(indices), self._labels(0, indices, self._cumulative)
+
+    def load_labels(self):
+        return self._labels(0, np.arange(self.num_samples), self._cumulative)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(num_samples={self.num_samples}, '
+                f'num_classes={self.num_classes}, shape={self.shape}, seed={self.seed})')
+
+
+class SyntheticMultiTaskData(_Synthetic, MultiTaskDataset):
+    """Synthetic multitask classification data, generated on demand.
+
+    Like `SyntheticData`, with labels for `num_tasks` tasks named
+    'task0', 'task1', ..., each drawn independently.
+
+    Parameters
+    ----------
+    num_samples : int
+        Length of the dataset.
+
+    num_tasks : int
+        Number of tasks.
+
+    num_classes : int or sequence of int
+        Number of classes, for every task or for each task.
+
+    shape : tuple
+        Shape of the features of one sample.
+
+    seed : int
+        Seed of the dataset.
+
+    imbalance : float or sequence of float
+        Ratio of the frequencies of the most and least common class, for
+        every task or for each task.
+
+    dtype : str
+        Dtype of the features.
+
+    transform : callable, optional
+        Applied to each sample of data.
+
+    target_transform : callable, optional
+        Applied to the label of each task.
+    """
+
+    def __init__(self, num_samples, num_tasks, num_classes, shape=(10,), seed=13,
+                 imbalance=1.0, dtype='float32', transform=None, target_transform=None):
+        self._init(num_samples, shape, seed, dtype, transform, target_transform)
+        tasks = [f'task{i}' for i in range(num_tasks)]
+        num_classes = _per_task(num_classes, num_tasks)
+        imbalance = _per_task(imbalance, num_tasks)
+        self.num_classes = dict(zip(tasks, num_classes))
+        self.weights = {
+            task: _weights(classes, ratio, None)
+            for task, classes, ratio in zip(tasks, num_classes, imbalance)
+        }
+        # Each task keeps its own stream, so deleting one leaves the others unchanged
+        self._streams = {task: i for i, task in enumerate(tasks)}
+
+    @property
+    def tasks(self):
+        return list(self._streams)
+
+    @property
+    def labels(self):
+        """Labels of each task, generated only for the task looked up.
+
+        Labels assigned to the dataset, e.g. by `load_cached`, are kept
+        and returned instead, while samples are still generated.
+        """
+        labels = self.__dict__.get('_labels')
+        return SyntheticLabels(self) if labels is None else labels
+
+    @labels.setter
+    def labels(self, labels):
+        MultiTaskDataset.labels.fset(self, labels)
+
+    def _task_labels(self, indices):
+        return {
+            task: self._labels(stream, indices, np.cumsum(self.weights[task]))
+            for task, stream in self._streams.items()
+        }
+
+    def _generate(self, indices):
+        return self.features(indices), self._task_labels(indices)
+
+    def get_tasks(self):
+        return self.tasks
+
+    def get_label(self, label):
+        indices = np.arange(self.num_samples)
+        return self._labels(self._streams[label], indices, np.cumsum(self.weights[label]))
+
+    def del_label(self, label):
+        del self._streams[label], self.num_classes[label], self.weights[label]
+
+    def index_labels(self, idx):
+        labels = self._task_labels(self._indices(np.atleast_1d(idx)))
+        if np.ndim(idx) == 0:
+            return {task: value[0] for task, value in labels.items()}
+        return labels
+
+    def load_labels(self):
+        return {task: self.get_label(task) for task in self.tasks}
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(num_samples={self.num_samples}, '
+                f'tasks={self.tasks}, shape={self.shape}, seed={self.seed})')
+
+
+class SyntheticLabels(Mapping):
+    """Labels of a `SyntheticMultiTaskData`, by task.
+
+    Nothing is held: looking up a task generates its labels over the whole
+    dataset, and `gather` generates the labels of the requested samples.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, task):
+        return self.dataset.get_label(task)
+
+    def __iter__(self):
+        return iter(self.dataset.tasks)
+
+    def __len__(self):
+        return len(self.dataset.tasks)
+
+    def gather(self, idx):
+        return self.dataset.index_labels(idx)
+
+    def __repr__(self):
+        return f'SyntheticLabels(tasks={self.dataset.tasks}, num_samples={len(self.dataset)})'
+
+
+def _per_task(value, num_tasks):
+    if np.ndim(value) == 0:
+        return [value] * num_tasks
+    if len(value) != num_tasks:
+        raise ValueError(f'Expected one value per task, got {len(value)} for {num_tasks} tasks.')
+    return list(value)
+
+
+def _weights(num_classes, imbalance, weights):
+    if weights is None:
+        return class_weights(num_classes, imbalance)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) != num_classes or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError('Weights must be one non-negative value per class.')
+    return weights / weights.sum()
@@ -1,15 +1,20 @@
 import os
-import torch
 
 import numpy as np
-import pandas as pd
 
 from datastore.api import InMemoryDataset
+from datastore.api.columnar import (
+    is_columnar, open_column, read_columnar, read_manifest, write_columnar
+)
 from datastore.utils.utils import (
     download_url, makedir_exist_ok
 )
 
 
+# Rows of an HDF5 table read at a time when processing
+CHUNK_ROWS = 65536
+
+
 class Uno(InMemoryDataset):
     """Uno Dataset
 
@@ -27,74 +32,156 @@ class Uno(InMemoryDataset):
         If true, downloads the dataset from the internet and
         puts it in root directory. If dataset is already downloaded, it is not
         downloaded again.
+
+    inputs : tuple of str
+        Input blocks to load, out of 'gene_data' and 'drug_data'. Samples
+        are the block itself when a single input is requested, and a tuple
+        with one entry per input otherwise. Blocks that are not requested
+        are never read.
+
+    mmap : bool, optional
+        If true, input blocks are memory-mapped instead of read into memory.
     """
     urls = [
         'http://ftp.mcs.anl.gov/pub/candle/public/benchmarks/Pilot1/uno/top_21_auc_1fold.uno.h5',
     ]
 
+    # Expected digests of the raw files, as 'algorithm:hexdigest' keyed
+    # by filename. Files without an entry are not verified.
+    checksums = {}
+
+    # Processed partitions, stored in the columnar cache format with one
+    # memory-mappable file per input block
+    training_folder = 'train'
+    test_folder = 'test'
+
+    # Processed files of earlier versions, migrated on first use
     training_data_file = 'train_data.pt'
     training_label_file = 'train_labels.pt'
     test_data_file = 'test_data.pt'
     test_label_file = 'test_labels.pt'
 
-    def __init__(self, root, partition, transform=None, 
-                 target_transform=None, download=False):
+    def __init__(self, root, partition, transform=None,
+                 target_transform=None, download=False,
+                 inputs=('gene_data',), mmap=False):
         self.root = os.path.expanduser(root)
         self.transform = transform
         self.target_transform = target_transform
+        self.inputs = tuple(inputs)
+        self.mmap = mmap
 
         if download:
             self.download()
 
+        if not self._check_exists():
+            self._migrate()
+
         if not self._check_exists():
             raise RuntimeError('Dataset not found.' +
                                ' You can use download=True to download it')
 
         self.partition = partition
         if self.partition == 'train':
-            data_file = self.training_data_file
-            label_file = self.training_label_file
+            folder = self.training_folder
         elif self.partition == 'test':
-            data_file = self.test_data_file
-            label_file = self.test_label_file
+            folder = self.test_folder
         else:
             raise ValueError("Partition must either be 'train' or 'test'.")
 
-        self.data = torch.load(os.path.join(self.processed_folder, data_file))
-        self.targets = torch.load(os.path.join(self.processed_folder, label_file))
+        path = os.path.join(self.processed_folder, folder)
+        unknown = set(self.inputs) - set(read_manifest(path)['data_keys'])
+        if not self.inputs or unknown:
+            raise ValueError(f'Unknown inputs {sorted(unknown)}, '
+                             "choose from 'gene_data' and 'drug_data'.")
+
+        columns = [f'data.{key}' for key in self.inputs] + ['labels']
+        self.data, self.targets = read_columnar(path, columns=columns, mmap=mmap)
 
     def __len__(self):
-        return len(self.data['gene_data'])
+        return len(self.data[self.inputs[0]])
 
     def load_data(self):
         return self.data, self.targets
 
-    def read_data(self, data_file, partition):
-        """ Read in the H5 data """
+    def load_labels(self):
+        return self.targets
+
+    @staticmethod
+    def read_table(store, key, chunksize=CHUNK_ROWS, columns=None, allocate=np.empty):
+        """Read an HDF5 table in row chunks into one preallocated array.
+
+        Parameters
+        ----------
+        store : pd.HDFStore
+            Open store holding the table.
+
+        key : str
+            Name of the table.
+
+        chunksize : int
+            Number of rows read at a time.
+
+        columns : list of str, optional
+            Columns to read. Reads all columns by default.
+
+        allocate : callable
+            Called as ``allocate(shape, dtype)`` to create the array, e.g.
+            to fill a column of a cache on disk with `open_column`.
+
+        Returns
+        -------
+        np.ndarray of shape (rows, columns), filled chunk by chunk so that
+        only one chunk of the table is held as a DataFrame at a time.
+        """
+        nrows = store.get_storer(key).nrows
+        array = None
+        for start in range(0, max(nrows, 1), chunksize):
+            chunk = store.select(key, start=start, stop=min(start + chunksize, nrows))
+            if columns is not None:
+                chunk = chunk[columns]
+            if array is None:
+                array = allocate((nrows, chunk.shape[1]), chunk.values.dtype)
+            array[start:start + len(chunk)] = chunk.values
+        if hasattr(array, 'flush'):
+            array.flush()
+        return array
+
+    def read_data(self, store, partition, path=None):
+        """Read in the H5 data from an open `pd.HDFStore`
+
+        If `path` is given, each input block is written straight into its
+        column of the columnar cache at `path`, see `open_column`, instead
+        of being read into memory.
+        """
+        import torch
+
         if partition == 'train':
-            gene_data = 'x_train_0'
-            drug_data = 'x_train_1'
+            tables = {'gene_data': 'x_train_0', 'drug_data': 'x_train_1'}
         else:
-            gene_data = 'x_val_0'
-            drug_data = 'x_val_1'
+            tables = {'gene_data': 'x_val_0', 'drug_data': 'x_val_1'}
 
-        gene_data = torch.tensor(pd.read_hdf(data_file, gene_data).values)
-        drug_data = torch.tensor(pd.read_hdf(data_file, drug_data).values)
-        data = {'gene_data': gene_data, 'drug_data': drug_data}
+        data = {}
+        for name, key in tables.items():
+            allocate = np.empty
+            if path is not None:
+                column = f'data.{name}'
+                allocate = lambda shape, dtype, column=column: open_column(path, column, shape, dtype)
+            data[name] = torch.from_numpy(self.read_table(store, key, allocate=allocate))
 
         return data
 
-    def read_targets(self, data_file, partition):
+    def read_targets(self, store, partition):
         """Get dictionary of targets specified by user."""
+        import torch
+
         if partition == 'train':
             label = 'y_train'
         else:
             label = 'y_val'
 
+        auc = self.read_table(store, label, columns=['AUC'])[:, 0]
         tasks = {
-            'response': torch.tensor(
-                pd.read_hdf(data_file, label)['AUC'].apply(lambda x: 1 if x < 0.5 else 0)
-            )
+            'response': torch.from_numpy((auc < 0.5).astype(np.int64))
         }
 
         return tasks
@@ -108,10 +195,11 @@ class Uno(InMemoryDataset):
 
         Returns
         -------
-        (document, target) : tuple
-           where target is index of the target class.
+        (data, target) : tuple
+           where data holds the requested inputs and target maps each task
+           to its label.
         """
-        data = self.data['gene_data'][idx]
+        data = self._inputs(idx)
 
         if self.transform is not None:
             data = self.transform(data)
@@ -127,6 +215,42 @@ class Uno(InMemoryDataset):
 
         return data, targets
 
+    def get_batch(self, indices):
+        """
+        Parameters
+        ----------
+        indices : sequence of int
+          Indices of the data to be loaded.
+
+        Returns
+        -------
+        (data, targets) : tuple
+           where each input is stacked along the first axis and targets
+           maps each task to its labels for the batch.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        data = self._inputs(indices)
+
+        if self.transform is not None:
+            data = self._map_batch(self.transform, data)
+
+        targets = {}
+        for key, value in self.targets.items():
+            subset = value[indices]
+
+            if self.target_transform is not None:
+                subset = self._map_batch(self.target_transform, subset)
+
+            targets[key] = subset
+
+        return data, targets
+
+    def _inputs(self, idx):
+        """ Gather the requested input blocks, each with one index """
+        if len(self.inputs) == 1:
+            return self.data[self.inputs[0]][idx]
+        return tuple(self.data[key][idx] for key in self.inputs)
+
     @property
     def raw_folder(self):
         return os.path.join(self.root, self.__class__.__name__, 'raw')
@@ -136,10 +260,30 @@ class Uno(InMemoryDataset):
         return os.path.join(self.root, self.__class__.__name__, 'processed')
 
     def _check_exists(self):
-        return os.path.exists(os.path.join(self.processed_folder, self.training_data_file)) and \
-               os.path.exists(os.path.join(self.processed_folder, self.training_label_file)) and \
-               os.path.exists(os.path.join(self.processed_folder, self.test_data_file)) and \
-               os.path.exists(os.path.join(self.processed_folder, self.test_label_file))
+        return is_columnar(os.path.join(self.processed_folder, self.training_folder)) and \
+               is_columnar(os.path.join(self.processed_folder, self.test_folder))
+
+    def _migrate(self):
+        """ Convert `.pt` files processed by earlier versions, if there are any """
+        legacy = [
+            (self.training_folder, self.training_data_file, self.training_label_file),
+            (self.test_folder, self.test_data_file, self.test_label_file),
+        ]
+        for _, data_file, label_file in legacy:
+            data_path = os.path.join(self.processed_folder, data_file)
+            label_path = os.path.join(self.processed_folder, label_file)
+            if not (os.path.exists(data_path) and os.path.exists(label_path)):
+                return
+
+        import torch
+
+        print('Migrating processed files...')
+        for folder, data_file, label_file in legacy:
+            write_columnar(
+                os.path.join(self.processed_folder, folder),
+                torch.load(os.path.join(self.processed_folder, data_file)),
+                torch.load(os.path.join(self.processed_folder, label_file))
+            )
 
     @staticmethod
     def extract_array(path, remove_finished=False):
@@ -161,32 +305,25 @@ class Uno(InMemoryDataset):
         for url in self.urls:
             filename = url.rpartition('/')[2]
             file_path = os.path.join(self.raw_folder, filename)
-            download_url(url, root=self.raw_folder, filename=filename, md5=None)
+            # A single large file, fetched as parallel byte ranges
+            download_url(
+                url, root=self.raw_folder, filename=filename, md5=None,
+                checksum=self.checksums.get(filename), segments=4
+            )
             #self.extract_array(path=file_path, remove_finished=False)
 
-        # process and save as numpy files
+        # process into columnar caches, reading train and val in one open. Input
+        # blocks are written in place, and one partition is finished before the next
         print('Processing...')
 
-        training_set = (
-            self.read_data(os.path.join(self.raw_folder, 'top_21_auc_1fold.uno.h5'), 'train'),
-            self.read_targets(os.path.join(self.raw_folder, 'top_21_auc_1fold.uno.h5'), 'train')
-        )
-        test_set = (
-            self.read_data(os.path.join(self.raw_folder, 'top_21_auc_1fold.uno.h5'), 'test'),
-            self.read_targets(os.path.join(self.raw_folder, 'top_21_auc_1fold.uno.h5'), 'test')
-        )
-
-        # Save processed training data
-        train_data_path = os.path.join(self.processed_folder, self.training_data_file)
-        torch.save(training_set[0], train_data_path)
-        train_label_path = os.path.join(self.processed_folder, self.training_label_file)
-        torch.save(training_set[1], train_label_path)
-
-        # Save processed test data
-        test_data_path = os.path.join(self.processed_folder, self.test_data_file)
-        torch.save(test_set[0], test_data_path)
-        test_label_path = os.path.join(self.processed_folder, self.test_label_file)
-        torch.save(test_set[1], test_label_path)
+        import pandas as pd
+        with pd.HDFStore(os.path.join(self.raw_folder, 'top_21_auc_1fold.uno.h5'), mode='r') as store:
+            for partition, folder in [('train', self.training_folder), ('test', self.test_folder)]:
+                path = os.path.join(self.processed_folder, folder)
+                data = self.read_data(store, partition, path)
+                targets = self.read_targets(store, partition)
+                write_columnar(path, data, targets, filled=[f'data.{key}' for key in data])
+                del data, targets
 
         print('Done!')
 
@@ -1,5 +1,5 @@
 from .bootstrap import leave_one_out_bootstrap
 
 from .cross_validation import (
-    stratified_split, multitask_stratified_split
-)
\ No newline at end of file
+    stratified_split, multitask_stratified_split, multilabel_stratified_split
+)
@@ -2,9 +2,12 @@ import math
 import numpy as np
 
 from collections import namedtuple
-from sklearn.utils import resample
 
 from datastore.api.data import Subset
+from datastore.sampling.parallel import imap, spawn_seeds
+
+
+BootstrapSample = namedtuple('BootstrapSample', 'train test')
 
 
 def dummy_indices(dataset):
@@ -12,50 +15,110 @@ def dummy_indices(dataset):
     return [x for x in range(len(dataset))]
 
 
-def sample(dataset, num_samples, replace=True):
+def sample(dataset, num_samples, replace=True, seed=None):
     """ Sample the dataset """
-    data_idx = dummy_indices(dataset)
-    sample_idx = resample(data_idx, n_samples=num_samples, replace=replace)
+    rng = np.random.default_rng(seed)
+    sample_idx = rng.choice(len(dataset), size=num_samples, replace=replace)
     return Subset(dataset, sample_idx)
 
 
-def leave_one_out_bootstrap(dataset, num_bootstraps, prop_train=0.5, seed=13):
-    """ Create bootstrap samples 
+def bootstrap_indices(num_samples, num_bootstraps, prop_train=0.5, seed=13):
+    """ Draw all bootstrap replicates at once
 
     Parameters
     ----------
-    dataset : datastore.dataset 
+    num_samples : int
+        Number of samples in the dataset
 
     num_bootstraps : int
         Number of bootstrap samples
 
     prop_train : float
         Proportion of samples to make up the training set
-    
-    seed : int
+
+    seed : int or np.random.SeedSequence
         Random seed to control the sampling
 
     Returns
     -------
-    samples : list(namedtuple<Subset, Subset>)
-        bootstrap samples of the data
+    train_idx : np.ndarray
+        (num_bootstraps, n_train) int32 matrix, one replicate per row
+
+    test_idx : list(np.ndarray)
+        out-of-bag indices of each replicate
     """
-    BootstrapSample = namedtuple('BootstrapSample', 'train test')
+    rng = np.random.default_rng(seed)
     # Lean towards a slightly larger training set
-    n_samples = math.ceil(len(dataset) * prop_train)
-    data_idx = dummy_indices(dataset) 
+    n_train = math.ceil(num_samples * prop_train)
+    train_idx = rng.integers(
+        0, num_samples, size=(num_bootstraps, n_train), dtype=np.int32
+    )
+    # Samples never drawn into a replicate make up its out-of-bag set
+    test_idx = [
+        np.flatnonzero(np.bincount(row, minlength=num_samples) == 0).astype(np.int32)
+        for row in train_idx
+    ]
+
+    return train_idx, test_idx
 
-    samples = []
-    for i in range(num_bootstraps):
-        train_idx = resample(data_idx, n_samples=n_samples)
-        # Get dataset indices not included in training sample 
-        test_idx = np.setdiff1d(data_idx, train_idx)
 
-        sample = BootstrapSample(
-            train = Subset(dataset, train_idx),
-            test = Subset(dataset, test_idx)
-        )
+def leave_one_out_bootstrap(dataset, num_bootstraps, prop_train=0.5, seed=13,
+                            lazy=False, num_workers=0, chunksize=32):
+    """ Create bootstrap samples 
+
+    Replicates are drawn in blocks of `chunksize`, each block from its own
+    random stream spawned from `seed`. The samples only depend on `seed`
+    and `chunksize`, whether they are drawn lazily, eagerly or in parallel.
 
-        samples.append(sample)
+    Parameters
+    ----------
+    dataset : datastore.dataset 
 
-    return samples 
\ No newline at end of file
+    num_bootstraps : int
+        Number of bootstrap samples
+
+    prop_train : float
+        Proportion of samples to make up the training set
+    
+    seed : int
+        Random seed to control the sampling
+
+    lazy : bool
+        If true, return a generator that draws samples as they are consumed
+
+    num_workers : int
+        Number of worker processes drawing blocks of replicates
+
+    chunksize : int
+        Number of replicates drawn at once
+
+    Returns
+    -------
+    samples : list(namedtuple<Subset, Subset>)
+        bootstrap samples of the data, or a generator of them if `lazy`
+    """
+    samples = _iter_bootstraps(
+        dataset, num_bootstraps, prop_train, seed, num_workers, chunksize
+    )
+
+    if lazy:
+        return samples
+
+    return list(samples)
+
+
+def _iter_bootstraps(dataset, num_bootstraps, prop_train, seed, num_workers, chunksize):
+    """ Generate bootstrap samples block by block """
+    sizes = [
+        min(chunksize, num_bootstraps - start)
+        for start in range(0, num_bootstraps, chunksize)
+    ]
+    seeds = spawn_seeds(seed, len(sizes))
+    tasks = ((len(dataset), size, prop_train, block_seed) for size, block_seed in zip(sizes, seeds))
+
+    for train_idx, test_idx in imap(bootstrap_indices, tasks, num_workers):
+        for train, test in zip(train_idx, test_idx):
+            yield BootstrapSample(
+                train = Subset(dataset, train),
+                test = Subset(dataset, test)
+            )
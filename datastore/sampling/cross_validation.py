@@ -1,45 +1,171 @@
+import numpy as np
+
 from collections import namedtuple
-from sklearn.model_selection import StratifiedKFold
 
 from datastore.api.data import Subset
+from datastore.sampling.parallel import imap, spawn_seeds
 
 
-def stratified_split(dataset, num_splits, seed=42):
-    """ Create stratified k-fold splits
+Split = namedtuple('Split', 'train valid')
+
+
+def stratified_folds(labels, num_splits, seed):
+    """ Compute the train and validation indices of stratified k-folds
 
     Parameters
     ----------
-    dataset : datastore.dataset
+    labels : np.ndarray
+        Labels to stratify on
 
     num_splits : int
-        Number of splits of the data (usually denoted by `k` folds)
+        Number of splits of the data
 
     seed : int
         Random seed to control the splits
 
     Returns
     -------
-    splits : list(namedtuple<Subset, Subset>)
-        stratified splits of the data
+    folds : list(tuple<np.ndarray, np.ndarray>)
+        train and validation indices of each fold
     """
-    skf = StratifiedKFold(n_splits=num_splits, random_state=seed)
-    data, labels = dataset.load_data()
+    from sklearn.model_selection import StratifiedKFold
+
+    skf = StratifiedKFold(n_splits=num_splits, shuffle=True, random_state=seed)
+    # Only the labels are used to stratify, the data is a placeholder
+    return list(skf.split(np.zeros(len(labels)), labels))
+
+
+def iterative_stratified_folds(labels, num_splits, seed):
+    """ Compute k-folds jointly stratified over several tasks
+
+    Every (task, class) pair is treated as a label, following the
+    iterative stratification of Sechidis et al. (2011). The label with the
+    fewest unassigned samples is handled first, and all of its unassigned
+    samples are spread at once across the folds that still need that
+    label the most. Bookkeeping is done on (fold, label) count matrices, so
+    the cost grows with the number of samples times the number of tasks.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        (n_samples, n_tasks) array with the class of each sample per task
+
+    num_splits : int
+        Number of splits of the data
+
+    seed : int
+        Random seed used to break ties
+
+    Returns
+    -------
+    folds : list(tuple<np.ndarray, np.ndarray>)
+        train and validation indices of each fold
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.asarray(labels).reshape(len(labels), -1)
+    num_samples, num_tasks = labels.shape
+
+    # Give every (task, class) pair its own label id
+    codes = np.empty(labels.shape, dtype=np.int64)
+    num_labels = 0
+    for task in range(num_tasks):
+        _, inverse = np.unique(labels[:, task], return_inverse=True)
+        codes[:, task] = inverse.ravel() + num_labels
+        num_labels = codes[:, task].max() + 1
+
+    counts = np.bincount(codes.ravel(), minlength=num_labels)
+    # Samples carrying each label, in random order
+    order = rng.permutation(num_samples)
+    pairs = codes[order].ravel()
+    by_label = np.repeat(order, num_tasks)[np.argsort(pairs, kind='stable')]
+    members = np.split(by_label, np.cumsum(counts)[:-1])
+
+    desired = np.tile(counts / num_splits, (num_splits, 1))
+    capacity = np.full(num_splits, num_samples / num_splits)
+    remaining = counts.copy()
+    folds = np.full(num_samples, -1)
+
+    while remaining.any():
+        label = np.argmin(np.where(remaining > 0, remaining, np.iinfo(remaining.dtype).max))
+        samples = members[label][folds[members[label]] < 0]
+
+        need = np.maximum(desired[:, label], 0)
+        if need.sum() <= 0:
+            need = np.maximum(capacity, 0)
+        if need.sum() <= 0:
+            need = np.ones(num_splits)
+
+        allocation = _allocate(len(samples), need, capacity, rng)
+        assignment = np.repeat(np.arange(num_splits), allocation)
+        folds[samples] = assignment
+
+        assigned = np.bincount(
+            np.repeat(assignment, num_tasks) * num_labels + codes[samples].ravel(),
+            minlength=num_splits * num_labels
+        ).reshape(num_splits, num_labels)
+        desired -= assigned
+        remaining -= assigned.sum(axis=0)
+        capacity -= allocation
+
+    return [
+        (np.flatnonzero(folds != fold), np.flatnonzero(folds == fold))
+        for fold in range(num_splits)
+    ]
+
+
+def _allocate(num_samples, need, capacity, rng):
+    """ Split `num_samples` across folds in proportion to `need`
+
+    Uses largest remainders, breaking ties towards the folds with the most
+    remaining capacity and then at random.
+    """
+    share = need / need.sum() * num_samples
+    allocation = np.floor(share).astype(np.int64)
+    extra = num_samples - allocation.sum()
+    if extra:
+        order = np.lexsort((rng.random(len(need)), -capacity, -(share - allocation)))
+        allocation[order[:extra]] += 1
+    return allocation
+
+
+def stratified_split(dataset, num_splits, seed=42, num_repeats=1,
+                     lazy=False, num_workers=0):
+    """ Create stratified k-fold splits
+
+    Parameters
+    ----------
+    dataset : datastore.dataset
 
-    splits = []
-    Split = namedtuple('Split', 'train valid')
+    num_splits : int
+        Number of splits of the data (usually denoted by `k` folds)
 
-    for train_idx, valid_idx in skf.split(data, labels):
-        split = Split(
-            train = Subset(dataset, train_idx),
-            valid = Subset(dataset, valid_idx)
-        )
+    seed : int
+        Random seed to control the splits
 
-        splits.append(split)
+    num_repeats : int
+        Number of times the k-fold split is repeated, each time
+        with a different shuffle of the data
 
-    return splits
+    lazy : bool
+        If true, return a generator that computes splits as they
+        are consumed
 
+    num_workers : int
+        Number of worker processes computing the repeats
 
-def multitask_stratified_split(dataset, num_splits, label, seed=42):
+    Returns
+    -------
+    splits : list(namedtuple<Subset, Subset>)
+        stratified splits of the data, or a generator of them if `lazy`
+    """
+    labels = dataset.load_labels()
+    return _split(
+        stratified_folds, dataset, labels, num_splits, seed, num_repeats, lazy, num_workers
+    )
+
+
+def multitask_stratified_split(dataset, num_splits, label, seed=42, num_repeats=1,
+                               lazy=False, num_workers=0):
     """ Create stratified k-fold splits
 
     Parameters
@@ -56,25 +182,99 @@ def multitask_stratified_split(dataset, num_splits, label, seed=42):
     seed : int
         Random seed to control the splits
 
+    num_repeats : int
+        Number of times the k-fold split is repeated, each time
+        with a different shuffle of the data
+
+    lazy : bool
+        If true, return a generator that computes splits as they
+        are consumed
+
+    num_workers : int
+        Number of worker processes computing the repeats
+
     Returns
     -------
     splits : list(namedtuple<Subset, Subset>)
-        stratified splits of the data
+        stratified splits of the data, or a generator of them if `lazy`
     """
-    skf = StratifiedKFold(n_splits=num_splits, random_state=seed)
-    data, labels = dataset.load_data()
     # Stratifiy using given `label`
-    labels = labels[label]
+    labels = dataset.load_labels()[label]
+
+    return _split(
+        stratified_folds, dataset, labels, num_splits, seed, num_repeats, lazy, num_workers
+    )
+
+
+def multilabel_stratified_split(dataset, num_splits, tasks=None, seed=42,
+                                num_repeats=1, lazy=False, num_workers=0):
+    """ Create k-fold splits stratified jointly over several tasks
+
+    Unlike `multitask_stratified_split`, which balances a single task, the
+    classes of every chosen task are balanced across the folds at once.
+
+    Parameters
+    ----------
+    dataset : datastore.dataset
+
+    num_splits : int
+        Number of splits of the data (usually denoted by `k` folds)
+
+    tasks : list(str), optional
+        Keys to the labels dictionary to stratify on. Defaults to
+        all of the tasks.
+
+    seed : int
+        Random seed to control the splits
+
+    num_repeats : int
+        Number of times the k-fold split is repeated, each time
+        with a different shuffle of the data
+
+    lazy : bool
+        If true, return a generator that computes splits as they
+        are consumed
+
+    num_workers : int
+        Number of worker processes computing the repeats
+
+    Returns
+    -------
+    splits : list(namedtuple<Subset, Subset>)
+        stratified splits of the data, or a generator of them if `lazy`
+    """
+    labels = dataset.load_labels()
+    if tasks is None:
+        tasks = list(labels.keys())
+
+    labels = np.stack([np.asarray(labels[task]) for task in tasks], axis=1)
+
+    return _split(
+        iterative_stratified_folds, dataset, labels, num_splits, seed,
+        num_repeats, lazy, num_workers
+    )
+
+
+def _split(folds_fn, dataset, labels, num_splits, seed, num_repeats, lazy, num_workers):
+    splits = _iter_splits(
+        folds_fn, dataset, labels, num_splits, seed, num_repeats, num_workers
+    )
+
+    if lazy:
+        return splits
 
-    splits = []
-    Split = namedtuple('Split', 'train valid')
+    return list(splits)
 
-    for train_idx, valid_idx in skf.split(data, labels):
-        split = Split(
-            train = Subset(dataset, train_idx),
-            valid = Subset(dataset, valid_idx)
-        )
 
-        splits.append(split)
+def _iter_splits(folds_fn, dataset, labels, num_splits, seed, num_repeats, num_workers):
+    """ Generate the splits of each repeat from its own random stream """
+    labels = np.asarray(labels)
+    seeds = [int(repeat.generate_state(1)[0]) for repeat in spawn_seeds(seed, num_repeats)]
+    tasks = ((labels, num_splits, repeat_seed) for repeat_seed in seeds)
 
-    return splits
+    for folds in imap(folds_fn, tasks, num_workers):
+        for train_idx, valid_idx in folds:
+            yield Split(
+                train = Subset(dataset, train_idx),
+                valid = Subset(dataset, valid_idx)
+            )
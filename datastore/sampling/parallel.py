@@ -0,0 +1,66 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def spawn_seeds(seed, num_streams):
+    """ Spawn independent, reproducible seeds for `num_streams` workers
+
+    Parameters
+    ----------
+    seed : int or np.random.SeedSequence
+        Root seed of the plan
+
+    num_streams : int
+        Number of independent random streams
+
+    Returns
+    -------
+    seeds : list(np.random.SeedSequence)
+        one seed per stream, usable with `np.random.default_rng`
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(num_streams)
+
+
+def imap(func, tasks, num_workers=0):
+    """ Lazily map `func` over argument tuples, in order
+
+    Parameters
+    ----------
+    func : callable
+        Function to apply. Must be picklable when `num_workers` > 0.
+
+    tasks : iterable(tuple)
+        Positional arguments for each call
+
+    num_workers : int
+        Number of worker processes. Zero computes every result in the
+        calling process, as it is requested.
+
+    Yields
+    ------
+    result of each call, in the order of `tasks`. With worker processes at
+    most two calls per worker are in flight, so a long plan is never queued
+    up in memory all at once.
+    """
+    if not num_workers:
+        for args in tasks:
+            yield func(*args)
+        return
+
+    with ProcessPoolExecutor(num_workers) as pool:
+        pending = deque()
+        try:
+            for args in tasks:
+                pending.append(pool.submit(func, *args))
+                if len(pending) >= 2 * num_workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
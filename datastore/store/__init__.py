@@ -0,0 +1,2 @@
+from .sqlite import SQLiteDataset
+from .shards import ShardedDataset, assign_shards, write_shards
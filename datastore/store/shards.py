@@ -0,0 +1,331 @@
+import os
+import json
+import heapq
+
+import numpy as np
+
+from datastore.api import InMemoryDataset
+from datastore.api.columnar import KEY_FIELDS, read_columnar, read_manifest, write_columnar
+
+
+FORMAT_VERSION = 1
+INDEX = 'index.json'
+
+
+def write_shards(dataset, path, shard_size=65536):
+    """Split a dataset into fixed-size shards on disk.
+
+    Each shard is a columnar cache (see `datastore.api.columnar`) in its
+    own directory, and an `index.json` lists the shards and their sizes.
+
+    Parameters
+    ----------
+    dataset : datastore.api.Dataset
+        Dataset to split. Shards are read with `get_batch`.
+
+    path : str
+        Directory receiving the shards. Created if it does not exist.
+
+    shard_size : int
+        Number of samples per shard. The last shard holds the remainder.
+        Every rank reading the shards needs one, so choose it to give at
+        least as many shards as ranks, e.g. at most
+        ``len(dataset) // world_size``.
+
+    Returns
+    -------
+    index : dict
+        The index written to `path`.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    shards = []
+    for start in range(0, len(dataset), shard_size):
+        stop = min(start + shard_size, len(dataset))
+        name = f'shard-{len(shards):05d}'
+        data, labels = dataset.get_batch(np.arange(start, stop))
+        write_columnar(os.path.join(path, name), data, labels)
+        shards.append({'name': name, 'start': start, 'size': stop - start})
+
+    index = {
+        'format': FORMAT_VERSION,
+        'num_samples': len(dataset),
+        'shard_size': shard_size,
+        'shards': shards,
+    }
+    # The index goes last so a partially written set of shards is never valid
+    with open(os.path.join(path, INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+
+    return index
+
+
+def read_index(path):
+    """ Read the index of a sharded dataset """
+    with open(os.path.join(path, INDEX)) as f:
+        index = json.load(f)
+
+    if index.get('format') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported shard format in {path}')
+
+    return index
+
+
+def assign_shards(sizes, world_size, epoch=0, seed=0, shuffle=True):
+    """Deal shards out to ranks, balancing the number of samples.
+
+    Shards are taken largest first and each is given to the rank holding
+    the fewest samples so far (longest processing time first). Shards of
+    equal size are taken in an order shuffled from `seed` and `epoch`, so
+    ownership changes from one epoch to the next while every rank computes
+    the same assignment without communicating.
+
+    Parameters
+    ----------
+    sizes : sequence of int
+        Number of samples in each shard.
+
+    world_size : int
+        Number of ranks.
+
+    epoch : int
+        Epoch to compute the assignment for.
+
+    seed : int
+        Seed shared by all ranks.
+
+    shuffle : bool
+        If false, equal shards are taken in order and the assignment is
+        the same for every epoch.
+
+    Returns
+    -------
+    assignment : list of list of int
+        Shard numbers owned by each rank, in increasing order.
+
+    Raises
+    ------
+    ValueError
+        If there are fewer shards than ranks, since ranks without any
+        shard would run no steps while the others wait for them.
+    """
+    sizes = np.asarray(sizes)
+    if world_size > len(sizes):
+        raise ValueError(f'Cannot assign {len(sizes)} shards to {world_size} ranks, '
+                         'write the dataset with a smaller shard_size.')
+    if shuffle:
+        order = np.random.default_rng([seed, epoch]).permutation(len(sizes))
+    else:
+        order = np.arange(len(sizes))
+    # Stable sort keeps the shuffled order among shards of equal size
+    order = order[np.argsort(-sizes[order], kind='stable')]
+
+    loads = [(0, rank) for rank in range(world_size)]
+    assignment = [[] for _ in range(world_size)]
+    for shard in order:
+        load, rank = heapq.heappop(loads)
+        assignment[rank].append(int(shard))
+        heapq.heappush(loads, (load + int(sizes[shard]), rank))
+
+    return [sorted(shards) for shards in assignment]
+
+
+def _first(value):
+    """ First sample of a gathered column or group of columns """
+    if hasattr(value, 'keys'):
+        return {key: column[0] for key, column in value.items()}
+    return value[0]
+
+
+def _apply(func, value):
+    """ Apply `func` to a label, or to the label of each task """
+    if hasattr(value, 'keys'):
+        return {key: func(column) for key, column in value.items()}
+    return func(value)
+
+
+class ShardedDataset(InMemoryDataset):
+    """The shards of a dataset owned by one rank.
+
+    Only the shards assigned to `rank` are opened, so memory and startup
+    I/O per node shrink with the number of nodes. Every rank derives the
+    same assignment from `seed` and the epoch, see `assign_shards`.
+
+    Parameters
+    ----------
+    path : str
+        Directory written by `write_shards`.
+
+    rank : int
+        Rank of this process.
+
+    world_size : int
+        Number of ranks sharing the dataset.
+
+    epoch : int
+        Initial epoch, see `set_epoch`.
+
+    seed : int
+        Seed of the shard assignment, the same on every rank.
+
+    shuffle : bool
+        If true, shard ownership is reshuffled every epoch.
+
+    mmap : bool
+        If true, shards are memory-mapped rather than read into memory.
+
+    transform : callable, optional
+        Applied to each sample of data.
+
+    target_transform : callable, optional
+        Applied to each label.
+
+    Ranks can end up with slightly different numbers of samples when the
+    shards do not divide evenly, training loops that need equal lengths
+    should truncate to the smallest. There must be at least as many
+    shards as ranks, see `write_shards`.
+    """
+
+    def __init__(self, path, rank=0, world_size=1, epoch=0, seed=0, shuffle=True,
+                 mmap=False, transform=None, target_transform=None):
+        if not 0 <= rank < world_size:
+            raise ValueError('Rank must be in [0, world_size).')
+
+        self.path = path
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = seed
+        self.shuffle = shuffle
+        self.mmap = mmap
+        self.transform = transform
+        self.target_transform = target_transform
+
+        self.index = read_index(path)
+        # Every shard has the same columns, only their lengths differ
+        manifest = read_manifest(os.path.join(path, self.index['shards'][0]['name']))
+        self._keys = {prefix: manifest[field] for prefix, field in KEY_FIELDS.items()}
+        self._columns_info = manifest['columns']
+
+        self.shards = []
+        self._columns = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.epoch = None
+        self.set_epoch(epoch)
+
+    def set_epoch(self, epoch):
+        """Take the shards assigned to this rank for `epoch`.
+
+        Call this at the start of every epoch, on every rank, with the
+        same epoch number. Shards kept from the previous epoch are not
+        read again.
+        """
+        sizes = [shard['size'] for shard in self.index['shards']]
+        owned = assign_shards(sizes, self.world_size, epoch, self.seed, self.shuffle)[self.rank]
+        self.epoch = epoch
+        if owned == self.shards:
+            return
+
+        loaded = dict(zip(self.shards, self._columns))
+        self.shards = owned
+        self._columns = [loaded[shard] if shard in loaded else self._read(shard) for shard in owned]
+
+        lengths = [sizes[shard] for shard in owned]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    def _read(self, shard):
+        """ Columns of a shard as numpy arrays, keyed by column name """
+        shard_path = os.path.join(self.path, self.index['shards'][shard]['name'])
+        data, labels = read_columnar(shard_path, mmap=self.mmap)
+
+        columns = {}
+        for prefix, value in (('data', data), ('labels', labels)):
+            if hasattr(value, 'keys'):
+                for key in value.keys():
+                    columns[f'{prefix}.{key}'] = value[key]
+            else:
+                columns[prefix] = value
+
+        return {
+            name: column.numpy() if self._columns_info[name]['kind'] == 'torch' else column
+            for name, column in columns.items()
+        }
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _gather(self, name, indices):
+        """ Rows `indices` of one column, across the owned shards """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError('Index out of range')
+
+        shards = np.searchsorted(self.offsets, indices, side='right') - 1
+        local = indices - self.offsets[shards]
+
+        info = self._columns_info[name]
+        out = np.empty((len(indices),) + tuple(info['shape'][1:]), dtype=info['dtype'])
+        for shard in np.unique(shards):
+            mask = shards == shard
+            out[mask] = self._columns[shard][name][local[mask]]
+
+        if info['kind'] == 'torch':
+            import torch
+            return torch.from_numpy(out)
+        return out
+
+    def _group(self, prefix, indices):
+        keys = self._keys[prefix]
+        if keys is None:
+            return self._gather(prefix, indices)
+        return {key: self._gather(f'{prefix}.{key}', indices) for key in keys}
+
+    def _fetch(self, indices):
+        return self._group('data', indices), self._group('labels', indices)
+
+    def load_data(self):
+        return self._fetch(np.arange(len(self)))
+
+    def load_labels(self):
+        return self._group('labels', np.arange(len(self)))
+
+    def __getitem__(self, idx):
+        """
+        Parameters
+        ----------
+        index : int
+          Index of the data to be loaded, among the samples of this rank.
+
+        Returns
+        -------
+        (data, target) : tuple
+           where target maps each task to its label, or is the label itself
+           for single task data.
+        """
+        data, labels = (_first(value) for value in self._fetch([idx]))
+
+        if self.transform is not None:
+            data = self.transform(data)
+
+        if self.target_transform is not None:
+            labels = _apply(self.target_transform, labels)
+
+        return data, labels
+
+    def get_batch(self, indices):
+        data, labels = self._fetch(indices)
+
+        if self.transform is not None:
+            data = self._map_batch(self.transform, data)
+
+        if self.target_transform is not None:
+            labels = _apply(lambda value: self._map_batch(self.target_transform, value), labels)
+
+        return data, labels
+
+    def __repr__(self):
+        fmt_str = 'Dataset ' + self.__class__.__name__ + '\n'
+        fmt_str += '    Number of datapoints: {}\n'.format(self.__len__())
+        fmt_str += '    Rank: {} of {}\n'.format(self.rank, self.world_size)
+        fmt_str += '    Shards: {}\n'.format(self.shards)
+        fmt_str += '    Root Location: {}\n'.format(self.path)
+        return fmt_str
@@ -0,0 +1,306 @@
+import json
+import sqlite3
+
+import numpy as np
+
+from datastore.api import InMemoryDataset
+
+
+# Stay below SQLite's default limit on host parameters in one statement
+MAX_VARIABLES = 900
+
+
+def _quote(name):
+    """ Quote an identifier for use as a column name """
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _as_numpy(value):
+    if type(value).__module__.startswith('torch'):
+        return value.numpy()
+    return np.asarray(value)
+
+
+class SQLiteDataset(InMemoryDataset):
+    """Dataset stored in a single SQLite file.
+
+    Each sample is stored as the raw bytes of its array together with its
+    partition and one column per label, while the dtype and shape shared by
+    every sample are kept once in a `meta` table. Decoding a batch is then a
+    single `np.frombuffer` over the fetched blobs. The database is written in
+    WAL mode so that many processes can read from it at once.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database, as written by `SQLiteDataset.ingest`.
+
+    partition : str, optional
+        Only serve samples of this partition, e.g. 'train' or 'test'.
+
+    transform : callable, optional
+        Applied to each sample of data.
+
+    target_transform : callable, optional
+        Applied to each label.
+
+    **labels :
+        Only serve samples whose label for a task equals the given value,
+        e.g. ``subsite=3``.
+    """
+
+    def __init__(self, path, partition=None, transform=None,
+                 target_transform=None, **labels):
+        self.path = path
+        self.partition = partition
+        self.transform = transform
+        self.target_transform = target_transform
+        self.filters = labels
+        self._conn = None
+
+        meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        self.dtype = np.dtype(json.loads(meta['dtype']))
+        self.shape = tuple(json.loads(meta['shape']))
+        self.kind = json.loads(meta['kind'])
+        self.label_keys = json.loads(meta['label_keys'])
+        self.label_dtypes = [np.dtype(dtype) for dtype in json.loads(meta['label_dtypes'])]
+
+        where, params = self._where(partition, labels)
+        rows = self.conn.execute(f'SELECT id FROM samples{where} ORDER BY id', params)
+        self.rowids = np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    @classmethod
+    def ingest(cls, dataset, path, partition='train', batch_size=4096):
+        """Bulk load an existing dataset into a SQLite database.
+
+        All samples are written with `executemany` inside one transaction.
+        Several partitions can be added to the same database by calling
+        this once per partition.
+
+        Parameters
+        ----------
+        dataset : datastore.api.Dataset
+            Dataset to copy. Samples are read in batches with `get_batch`.
+
+        path : str
+            Path to the database. Created if it does not exist.
+
+        partition : str
+            Partition the samples are stored under.
+
+        batch_size : int
+            Number of samples read and inserted at a time.
+
+        Returns
+        -------
+        SQLiteDataset serving the ingested partition.
+        """
+        data, labels = dataset.get_batch([0])
+        kind = 'torch' if type(data).__module__.startswith('torch') else 'numpy'
+        if isinstance(labels, dict):
+            label_keys = list(labels)
+            label_dtypes = [_as_numpy(labels[key]).dtype.str for key in label_keys]
+        else:
+            label_keys = None
+            label_dtypes = [_as_numpy(labels).dtype.str]
+
+        data = _as_numpy(data)
+        meta = {
+            'dtype': data.dtype.str,
+            'shape': list(data.shape[1:]),
+            'kind': kind,
+            'label_keys': label_keys,
+            'label_dtypes': label_dtypes,
+        }
+        columns = [_quote(key) for key in (label_keys or ['labels'])]
+
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS samples '
+                    f'(id INTEGER PRIMARY KEY, partition TEXT, data BLOB, {", ".join(columns)})'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS samples_partition ON samples (partition)')
+                cls._check_meta(conn, meta)
+
+                insert = (
+                    f'INSERT INTO samples (partition, data, {", ".join(columns)}) '
+                    f'VALUES ({", ".join("?" * (len(columns) + 2))})'
+                )
+                for start in range(0, len(dataset), batch_size):
+                    indices = np.arange(start, min(start + batch_size, len(dataset)))
+                    data, labels = dataset.get_batch(indices)
+                    data = np.ascontiguousarray(_as_numpy(data))
+                    if label_keys is None:
+                        labels = [_as_numpy(labels).tolist()]
+                    else:
+                        labels = [_as_numpy(labels[key]).tolist() for key in label_keys]
+
+                    rows = zip([partition] * len(indices), map(bytes, data), *labels)
+                    conn.executemany(insert, rows)
+        finally:
+            conn.close()
+
+        return cls(path, partition=partition)
+
+    @staticmethod
+    def _check_meta(conn, meta):
+        """ Record the sample layout, or check it matches the stored one """
+        stored = dict(conn.execute('SELECT key, value FROM meta'))
+        if not stored:
+            conn.executemany(
+                'INSERT INTO meta VALUES (?, ?)',
+                [(key, json.dumps(value)) for key, value in meta.items()]
+            )
+        elif {key: json.loads(value) for key, value in stored.items()} != meta:
+            raise ValueError('Dataset layout does not match the existing database.')
+
+    @staticmethod
+    def _where(partition, labels):
+        clauses, params = [], []
+        if partition is not None:
+            clauses.append('partition = ?')
+            params.append(partition)
+        for key, value in labels.items():
+            clauses.append(f'{_quote(key)} = ?')
+            params.append(value)
+
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return where, params
+
+    @property
+    def conn(self):
+        """ Read-only connection, opened lazily in each process """
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                f'file:{self.path}?mode=ro', uri=True, check_same_thread=False
+            )
+        return self._conn
+
+    def query(self, partition=None, **labels):
+        """Select the samples of a partition or with given label values.
+
+        Returns
+        -------
+        SQLiteDataset over the matching samples of the same database.
+        """
+        return SQLiteDataset(
+            self.path,
+            partition=partition,
+            transform=self.transform,
+            target_transform=self.target_transform,
+            **labels
+        )
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def load_data(self):
+        return self.get_batch(np.arange(len(self)))
+
+    def load_labels(self):
+        columns = ', '.join(_quote(key) for key in (self.label_keys or ['labels']))
+        where, params = self._where(self.partition, self.filters)
+        rows = self.conn.execute(f'SELECT {columns} FROM samples{where} ORDER BY id', params)
+
+        labels = np.array(rows.fetchall()).reshape(len(self), len(self.label_dtypes))
+        labels = [labels[:, i].astype(dtype) for i, dtype in enumerate(self.label_dtypes)]
+        return self._targets(labels)
+
+    def _fetch(self, rowids):
+        """ Fetch the rows with the given ids, in order of increasing id """
+        columns = ', '.join(_quote(key) for key in (self.label_keys or ['labels']))
+        select = f'SELECT data, {columns} FROM samples'
+
+        if len(rowids) and rowids[-1] - rowids[0] + 1 == len(rowids):
+            # A contiguous range of ids is one range scan
+            return self.conn.execute(
+                f'{select} WHERE id BETWEEN ? AND ? ORDER BY id',
+                (int(rowids[0]), int(rowids[-1]))
+            ).fetchall()
+
+        rows = []
+        for start in range(0, len(rowids), MAX_VARIABLES):
+            chunk = rowids[start:start + MAX_VARIABLES].tolist()
+            rows.extend(self.conn.execute(
+                f'{select} WHERE id IN ({", ".join("?" * len(chunk))}) ORDER BY id', chunk
+            ))
+        return rows
+
+    def _decode(self, rows):
+        """ Decode fetched rows into a data batch and per-task labels """
+        data = np.frombuffer(bytearray().join(row[0] for row in rows), dtype=self.dtype)
+        data = data.reshape((len(rows),) + self.shape)
+
+        labels = [
+            np.array([row[i + 1] for row in rows], dtype=dtype)
+            for i, dtype in enumerate(self.label_dtypes)
+        ]
+        return data, labels
+
+    def __getitem__(self, idx):
+        """
+        Parameters
+        ----------
+        index : int
+          Index of the data to be loaded.
+
+        Returns
+        -------
+        (data, target) : tuple
+           where target maps each task to its label, or is the label itself
+           for single task data.
+        """
+        data, labels = self._decode(self._fetch(self.rowids[[idx]]))
+        data = self._to_kind(data[0])
+
+        if self.transform is not None:
+            data = self.transform(data)
+
+        labels = [label[0] for label in labels]
+        if self.target_transform is not None:
+            labels = [self.target_transform(label) for label in labels]
+
+        return data, self._targets(labels)
+
+    def get_batch(self, indices):
+        # Fetch each distinct row once, in id order, then scatter back
+        rowids, inverse = np.unique(self.rowids[np.asarray(indices, dtype=np.intp)], return_inverse=True)
+        data, labels = self._decode(self._fetch(rowids))
+        data = self._to_kind(data[inverse])
+
+        if self.transform is not None:
+            data = self._map_batch(self.transform, data)
+
+        labels = [label[inverse] for label in labels]
+        if self.target_transform is not None:
+            labels = [self._map_batch(self.target_transform, label) for label in labels]
+
+        return data, self._targets(labels)
+
+    def _to_kind(self, data):
+        if self.kind == 'torch':
+            import torch
+            return torch.from_numpy(data)
+        return data
+
+    def _targets(self, labels):
+        if self.label_keys is None:
+            return labels[0]
+        return dict(zip(self.label_keys, labels))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Connections can't be pickled, each process opens its own
+        state['_conn'] = None
+        return state
+
+    def __repr__(self):
+        fmt_str = 'Dataset ' + self.__class__.__name__ + '\n'
+        fmt_str += '    Number of datapoints: {}\n'.format(self.__len__())
+        fmt_str += '    Split: {}\n'.format(self.partition)
+        fmt_str += '    Database: {}\n'.format(self.path)
+        return fmt_str
@@ -1,8 +1,26 @@
 import os
 import os.path
-import hashlib
+import mmap
+import json
+import time
 import errno
-from tqdm import tqdm
+import shutil
+import hashlib
+import threading
+
+from contextlib import contextmanager
+
+
+# Read and write downloads 1MB at a time
+CHUNK_SIZE = 1024 * 1024
+# Hash files in 16MB slices of a memory map
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+# Sidecar file caching the digests of the files in a directory
+CHECKSUM_CACHE = '.checksums.json'
+
+_checksum_lock = threading.Lock()
+# Don't split a download into ranges smaller than this
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
 
 
 def gen_bar_updater(pbar):
@@ -15,20 +33,147 @@ def gen_bar_updater(pbar):
     return bar_update
 
 
-def check_integrity(fpath, md5=None):
-    if md5 is None:
+def hash_file(fpath, algorithm='sha256'):
+    """Compute the hex digest of a file.
+
+    The file is memory-mapped and hashed in large slices. hashlib releases
+    the GIL while it hashes, so several files can be hashed in threads.
+
+    Args:
+        fpath (str): Path to the file
+        algorithm (str, optional): Name of a hashlib algorithm, e.g. 'sha256',
+            'blake2b' or 'md5'
+    """
+    digest = hashlib.new(algorithm)
+    if os.path.getsize(fpath) == 0:
+        return digest.hexdigest()
+
+    with open(fpath, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for start in range(0, len(view), HASH_CHUNK_SIZE):
+                    digest.update(view[start:start + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+
+    return digest.hexdigest()
+
+
+def _cache_path(fpath):
+    return os.path.join(os.path.dirname(os.path.abspath(fpath)), CHECKSUM_CACHE)
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _cache_entry(entries, fpath, stat):
+    """ Cached digests of a file, or a fresh entry if it has changed """
+    entry = entries.get(os.path.basename(fpath))
+    if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digests': {}}
+    return entry
+
+
+def file_digest(fpath, algorithm='sha256', cache=True):
+    """Hex digest of a file, reusing the sidecar cache when possible.
+
+    Digests are cached in a ``.checksums.json`` file next to the file, keyed
+    by its name, size and modification time, so an unchanged file is never
+    hashed twice.
+
+    Args:
+        fpath (str): Path to the file
+        algorithm (str, optional): Name of a hashlib algorithm
+        cache (bool, optional): If false, always hash the file
+    """
+    return hash_files([fpath], algorithm, cache=cache)[fpath]
+
+
+def hash_files(paths, algorithm='sha256', max_workers=4, cache=True):
+    """Hex digests of several files, hashed in a thread pool.
+
+    Args:
+        paths (list): Paths to the files
+        algorithm (str, optional): Name of a hashlib algorithm
+        max_workers (int, optional): Number of files hashed at once
+        cache (bool, optional): If false, always hash the files
+
+    Returns:
+        dict: Digest of each path
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    stats = {path: os.stat(path) for path in paths}
+    digests = {}
+    if cache:
+        with _checksum_lock:
+            caches = {}
+            for path in paths:
+                cache_path = _cache_path(path)
+                if cache_path not in caches:
+                    caches[cache_path] = _read_cache(cache_path)
+                entry = _cache_entry(caches[cache_path], path, stats[path])
+                if algorithm in entry['digests']:
+                    digests[path] = entry['digests'][algorithm]
+
+    missing = [path for path in paths if path not in digests]
+    with ThreadPoolExecutor(max(1, min(max_workers, len(missing)))) as pool:
+        digests.update(zip(missing, pool.map(lambda path: hash_file(path, algorithm), missing)))
+
+    if cache and missing:
+        with _checksum_lock:
+            for cache_path in {_cache_path(path) for path in missing}:
+                entries = _read_cache(cache_path)
+                for path in missing:
+                    if _cache_path(path) == cache_path:
+                        entry = _cache_entry(entries, path, stats[path])
+                        entry['digests'][algorithm] = digests[path]
+                        entries[os.path.basename(path)] = entry
+
+                tmp = '{}.{}.tmp'.format(cache_path, os.getpid())
+                try:
+                    with open(tmp, 'w') as f:
+                        json.dump(entries, f, indent=2)
+                    os.replace(tmp, cache_path)
+                except OSError:
+                    # e.g. a read-only directory, the digests are just not cached
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+
+    return digests
+
+
+def check_integrity(fpath, md5=None, checksum=None):
+    """Check a file against an expected digest.
+
+    Args:
+        fpath (str): Path to the file
+        md5 (str, optional): Expected MD5 digest
+        checksum (str, optional): Expected digest as ``'<algorithm>:<hexdigest>'``,
+            e.g. ``'sha256:9f86d0...'``
+
+    Returns:
+        bool: False if the file is missing or a digest does not match. True if
+            it matches, or if no digest was given.
+    """
+    expected = []
+    if md5 is not None:
+        expected.append(('md5', md5))
+    if checksum is not None:
+        expected.append(tuple(checksum.split(':', 1)))
+
+    if not expected:
         return True
     if not os.path.isfile(fpath):
         return False
-    md5o = hashlib.md5()
-    with open(fpath, 'rb') as f:
-        # read in 1MB chunks
-        for chunk in iter(lambda: f.read(1024 * 1024), b''):
-            md5o.update(chunk)
-    md5c = md5o.hexdigest()
-    if md5c != md5:
-        return False
-    return True
+
+    return all(file_digest(fpath, algorithm) == digest.lower() for algorithm, digest in expected)
 
 
 def makedir_exist_ok(dirpath):
@@ -44,8 +189,116 @@ def makedir_exist_ok(dirpath):
             raise
 
 
-def download_url(url, root, filename, md5):
-    from six.moves import urllib
+def _is_transient(error):
+    """ Whether a failed request is worth retrying """
+    from urllib.error import HTTPError
+
+    if isinstance(error, HTTPError):
+        return error.code >= 500 or error.code in (408, 429)
+    return True
+
+
+def _retry(fn, retries, backoff):
+    """ Call `fn`, retrying transient errors with exponential backoff """
+    from http.client import HTTPException
+
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except (OSError, HTTPException) as error:
+            if attempt == retries or not _is_transient(error):
+                raise
+            delay = backoff * 2 ** attempt
+            print('Download failed ({}), retrying in {:.1f}s'.format(error, delay))
+            time.sleep(delay)
+
+
+def _remote_size(url, timeout):
+    """ Size of the remote file, or None if it can't be fetched in ranges """
+    import urllib.request
+
+    request = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if response.headers.get('Accept-Ranges', '').lower() != 'bytes':
+            return None
+        length = response.headers.get('Content-Length')
+        return int(length) if length is not None else None
+
+
+def _fetch_range(url, part, pbar, timeout, start=0, end=None):
+    """Download bytes `start` to `end` (inclusive) of `url` into `part`.
+
+    An existing `part` file is resumed with an HTTP Range request.
+    """
+    import urllib.request
+    from urllib.error import HTTPError
+
+    done = _size(part)
+    if end is not None and done >= end - start + 1:
+        return
+
+    request = urllib.request.Request(url)
+    if done or start or end is not None:
+        last = '' if end is None else str(end)
+        request.add_header('Range', 'bytes={}-{}'.format(start + done, last))
+
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except HTTPError as error:
+        if error.code == 416 and done:
+            # Nothing left to fetch past the end of the file
+            return
+        raise
+
+    with response:
+        if response.status != 206 and (done or start or end is not None):
+            if start or end is not None:
+                raise RuntimeError('Server ignored the requested byte range of ' + url)
+            # The server ignored the range, start the part over
+            pbar.update(-done)
+            done = 0
+        expected = response.headers.get('Content-Length')
+        received = 0
+        with open(part, 'ab' if done else 'wb') as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                f.write(chunk)
+                received += len(chunk)
+                pbar.update(len(chunk))
+
+    # A connection dropped mid-body just ends the stream, so check the length
+    if expected is not None and received < int(expected):
+        from http.client import IncompleteRead
+        raise IncompleteRead(b'', int(expected) - received)
+
+
+def _size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def download_url(url, root, filename, md5, checksum=None, segments=1,
+                 retries=3, backoff=1.0, timeout=60):
+    """Download a file, resuming any partial download.
+
+    Data is written to ``<filename>.part`` and only moved into place once
+    complete, so an interrupted download picks up where it stopped with an
+    HTTP Range request.
+
+    Args:
+        url (str): URL to download
+        root (str): Directory to place the downloaded file in
+        filename (str): Name to save the file under
+        md5 (str, optional): MD5 checksum of the download. If None, do not check
+        checksum (str, optional): Expected digest as ``'<algorithm>:<hexdigest>'``
+        segments (int, optional): Number of ranges of a large file fetched in parallel
+        retries (int, optional): Number of retries of each request that fails
+        backoff (float, optional): Seconds to wait before the first retry, doubled
+            after every further failure
+        timeout (float, optional): Socket timeout of each request in seconds
+
+    Returns:
+        str: Path to the downloaded file
+    """
+    from tqdm import tqdm
 
     root = os.path.expanduser(root)
     fpath = os.path.join(root, filename)
@@ -53,24 +306,121 @@ def download_url(url, root, filename, md5):
     makedir_exist_ok(root)
 
     # downloads file
-    if os.path.isfile(fpath) and check_integrity(fpath, md5):
+    if os.path.isfile(fpath) and check_integrity(fpath, md5, checksum):
         print('Using downloaded and verified file: ' + fpath)
-    else:
-        try:
-            print('Downloading ' + url + ' to ' + fpath)
-            urllib.request.urlretrieve(
-                url, fpath,
-                reporthook=gen_bar_updater(tqdm(unit='B', unit_scale=True))
-            )
-        except:
-            if url[:5] == 'https':
-                url = url.replace('https:', 'http:')
-                print('Failed download. Trying https -> http instead.'
-                      ' Downloading ' + url + ' to ' + fpath)
-                urllib.request.urlretrieve(
-                    url, fpath,
-                    reporthook=gen_bar_updater(tqdm(unit='B', unit_scale=True))
-                )
+        return fpath
+
+    print('Downloading ' + url + ' to ' + fpath)
+    size = None
+    if segments > 1:
+        size = _retry(lambda: _remote_size(url, timeout), retries, backoff)
+
+    split = size is not None and size >= segments * MIN_SEGMENT_SIZE
+    parts = ['{}.part{}'.format(fpath, i) for i in range(segments)] if split else [fpath + '.part']
+    resumed = sum(_size(part) for part in parts)
+
+    with tqdm(unit='B', unit_scale=True, total=size, initial=resumed, desc=filename) as pbar:
+        if split:
+            part = _fetch_segments(url, fpath, size, parts, pbar, retries, backoff, timeout)
+        else:
+            part = parts[0]
+            _retry(lambda: _fetch_range(url, part, pbar, timeout), retries, backoff)
+
+    os.replace(part, fpath)
+
+    if not check_integrity(fpath, md5, checksum):
+        raise RuntimeError('Downloaded file {} is corrupted.'.format(fpath))
+
+    return fpath
+
+
+def _fetch_segments(url, fpath, size, parts, pbar, retries, backoff, timeout):
+    """ Fetch one byte range per part file in parallel and join them """
+    from concurrent.futures import ThreadPoolExecutor
+
+    segments = len(parts)
+    bounds = [size * i // segments for i in range(segments + 1)]
+
+    def fetch(i):
+        return _retry(
+            lambda: _fetch_range(url, parts[i], pbar, timeout, bounds[i], bounds[i + 1] - 1),
+            retries, backoff
+        )
+
+    with ThreadPoolExecutor(segments) as pool:
+        list(pool.map(fetch, range(segments)))
+
+    part = fpath + '.part'
+    with open(part, 'wb') as out:
+        for segment in parts:
+            with open(segment, 'rb') as f:
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+            os.unlink(segment)
+
+    return part
+
+
+def download_urls(urls, root, checksums=None, max_workers=4, **kwargs):
+    """Download several files concurrently.
+
+    Args:
+        urls (list): URLs to download. Each file is named after the last
+            component of its URL
+        root (str): Directory to place the downloaded files in
+        checksums (dict, optional): Expected digest of each file as
+            ``'<algorithm>:<hexdigest>'``, keyed by filename. Files without
+            an entry are not verified
+        max_workers (int, optional): Number of files downloaded at once
+        **kwargs: Passed on to `download_url`
+
+    Returns:
+        list: Paths to the downloaded files, in the order of `urls`
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    checksums = checksums or {}
+    with ThreadPoolExecutor(max_workers) as pool:
+        futures = []
+        for url in urls:
+            filename = url.rpartition('/')[2]
+            futures.append(pool.submit(
+                download_url, url, root, filename, None,
+                checksum=checksums.get(filename), **kwargs
+            ))
+        return [future.result() for future in futures]
+
+
+@contextmanager
+def timed(stage, timings):
+    """Time a stage of dataset preparation.
+
+    Args:
+        stage (str): Name of the stage
+        timings (dict): Seconds spent in each stage, updated in place
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        print('{}: {:.2f}s'.format(stage.capitalize(), timings[stage]))
+
+
+def link_or_copy(src, dst):
+    """Hard-link `src` to `dst`, falling back to a copy.
+
+    Files that need no conversion are linked into place so they are
+    neither read nor written again. A copy is made when linking is not
+    possible, e.g. across file systems.
+    """
+    tmp = dst + '.tmp'
+    if os.path.exists(tmp):
+        os.unlink(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
 
 
 def list_dir(root, prefix=False):
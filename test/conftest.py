@@ -0,0 +1,26 @@
+"""
+Fixtures shared by the test modules.
+"""
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def p3b3_root(tmpdir):
+    processed = tmpdir.mkdir('P3B3').mkdir('processed')
+    rng = np.random.RandomState(0)
+    for partition, size in [('train', 20), ('test', 10)]:
+        np.save(str(processed.join(f'{partition}_data.npy')), rng.randint(100, size=(size, 15)))
+        np.save(str(processed.join(f'{partition}_labels.npy')), rng.randint(4, size=(size, 4)))
+    return str(tmpdir)
+
+
+@pytest.fixture
+def kmnist_root(tmpdir):
+    processed = tmpdir.mkdir('KuzushijiMNIST').mkdir('processed')
+    rng = np.random.RandomState(0)
+    for partition, size in [('train', 20), ('test', 10)]:
+        np.save(str(processed.join(f'{partition}_data.npy')),
+                rng.randint(255, size=(size, 28, 28)).astype(np.uint8))
+        np.save(str(processed.join(f'{partition}_labels.npy')), rng.randint(49, size=size))
+    return str(tmpdir)
@@ -0,0 +1,136 @@
+"""
+Tests for `datastore.api.cache`.
+"""
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from datastore.api import CachedDataset, Lambda
+from datastore.api.cache import fingerprint
+from datastore.api.data import Subset
+from datastore.data import RandomData, RandomMultiTaskData
+
+
+class CountingTransform(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        return x * 2
+
+    def __repr__(self):
+        return 'CountingTransform()'
+
+
+def double(x):
+    return x * 2
+
+
+class TransformedRandomData(RandomData):
+
+    def __getitem__(self, idx):
+        return self.transform(self.data[idx]), self.labels[idx]
+
+    def get_batch(self, indices):
+        indices = np.asarray(indices)
+        return self._map_batch(self.transform, self.data[indices]), self.labels[indices]
+
+
+def transformed(transform):
+    dataset = TransformedRandomData(20, 3, seed=5)
+    dataset.data = np.arange(20.)
+    dataset.transform = transform
+    return dataset
+
+
+class TestCachedDataset(object):
+
+    def test_transform_runs_once(self):
+        transform = CountingTransform()
+        dataset = transformed(transform)
+        cached = CachedDataset(dataset)
+
+        for _ in range(3):
+            for idx in range(20):
+                assert cached[idx] == dataset[idx]
+        data, labels = cached.get_batch([3, 1, 3])
+        np.testing.assert_array_equal(data, [6., 2., 6.])
+        np.testing.assert_array_equal(labels, dataset.labels[[3, 1, 3]])
+
+        # 20 fills plus the 60 direct dataset[idx] reference calls
+        assert transform.calls == 80
+        info = cached.cache_info()
+        assert (info['misses'], info['hits']) == (20, 43)
+
+    def test_batch_misses_are_one_fetch(self):
+        dataset = RandomMultiTaskData(30, 3, 4)
+        cached = CachedDataset(dataset)
+        cached[2]
+        data, labels = cached.get_batch([1, 2, 5])
+        expected_data, expected_labels = dataset.get_batch([1, 2, 5])
+        np.testing.assert_array_equal(data, expected_data)
+        for task in expected_labels:
+            np.testing.assert_array_equal(labels[task], expected_labels[task])
+        assert cached.cache_info()['misses'] == 3
+
+        data, labels = cached.get_batch([])
+        assert len(data) == 0 and set(labels) == set(expected_labels)
+
+    def test_eviction_and_spill(self, tmpdir):
+        transform = CountingTransform()
+        dataset = transformed(transform)
+        # One sample is a float64 and an int64 label, 16 bytes
+        cached = CachedDataset(dataset, max_bytes=16 * 4, spill_dir=str(tmpdir))
+
+        for idx in range(10):
+            cached[idx]
+        info = cached.cache_info()
+        assert info['entries'] == 4 and info['nbytes'] == 64
+        assert info['evictions'] == 6
+        assert len(os.listdir(cached.spill_path)) == 6
+
+        assert cached[0] == (0., dataset.labels[0])
+        assert cached.cache_info()['disk_hits'] == 1
+        # 10 fills, and 3 samples read to fingerprint the dataset
+        assert transform.calls == 13
+
+        # A new cache over the same data and transform reuses the spill
+        again = CachedDataset(transformed(CountingTransform()), spill_dir=str(tmpdir))
+        assert again.spill_path == cached.spill_path
+        again[1]
+        assert again.cache_info()['disk_hits'] == 1
+
+        # Different transforms are kept apart
+        other = CachedDataset(transformed(lambda x: x), spill_dir=str(tmpdir), key='identity')
+        assert other.spill_path != cached.spill_path
+
+    def test_unstable_transforms_need_a_key(self, tmpdir):
+        for transform in (lambda x: x, Lambda(double)):
+            with pytest.raises(ValueError):
+                CachedDataset(transformed(transform), spill_dir=str(tmpdir))
+            # Nothing is spilled without a spill_dir, so no key is needed
+            CachedDataset(transformed(transform))
+
+    def test_subset_fingerprints(self):
+        dataset = RandomData(20, 3)
+        first = Subset(dataset, [0, 4, 5, 6, 19])
+        second = Subset(dataset, [0, 3, 5, 7, 19])
+        # Same first, middle and last samples, but different indices
+        assert first[2] == second[2]
+        assert fingerprint(first) != fingerprint(second)
+        assert fingerprint(first) == fingerprint(Subset(dataset, [0, 4, 5, 6, 19]))
+
+    def test_counts_in_stats_and_pickles(self):
+        cached = CachedDataset(RandomData(20, 3))
+        with cached.instrument() as stats:
+            cached[0]
+            cached[0]
+        assert (stats.cache_hits, stats.cache_misses) == (1, 1)
+
+        copy = pickle.loads(pickle.dumps(cached))
+        assert copy.cache_info()['entries'] == 0
+        assert copy[0] == cached[0]
@@ -0,0 +1,544 @@
+"""
+Tests for the bundled datasets and the `datastore.api` base classes.
+"""
+import os
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from datastore.api import LabelStore, ToFloat
+from datastore.api.data import Dataset, Subset, collate
+from datastore.api.stats import TimedTransform
+from datastore.data import (
+    P3B3, KuzushijiMNIST, RandomData, RandomMultiTaskData, SyntheticData, SyntheticMultiTaskData
+)
+from datastore.data.uno import Uno
+
+
+def assert_batch_matches_samples(dataset, indices):
+    data, targets = dataset.get_batch(indices)
+    for row, idx in enumerate(indices):
+        sample, target = dataset[idx]
+        np.testing.assert_array_equal(np.asarray(data[row]), np.asarray(sample))
+        if isinstance(target, dict):
+            assert set(targets) == set(target)
+            for key in target:
+                assert targets[key][row] == target[key]
+        else:
+            assert targets[row] == target
+
+
+class TestBatchIndexing(object):
+
+    def test_random(self):
+        assert_batch_matches_samples(RandomData(30, 3), [4, 0, 29, 4])
+
+    def test_random_multitask(self):
+        assert_batch_matches_samples(RandomMultiTaskData(30, 2, 3), [4, 0, 29, 4])
+
+    def test_p3b3(self, p3b3_root):
+        dataset = P3B3(p3b3_root, 'train', transform=lambda doc: doc + 1)
+        assert_batch_matches_samples(dataset, [3, 1, 19])
+
+    def test_kuzushiji(self, kmnist_root):
+        dataset = KuzushijiMNIST(kmnist_root, 'test', target_transform=lambda y: y * 2)
+        assert_batch_matches_samples(dataset, np.arange(10))
+
+    def test_subset(self):
+        dataset = RandomMultiTaskData(30, 2, 3)
+        subset = Subset(dataset, [10, 5, 7, 2])
+        data, targets = subset.get_batch([3, 0])
+        assert torch.equal(data, dataset.data[[2, 10]])
+        np.testing.assert_array_equal(targets['task1'], dataset.labels['task1'][[2, 10]])
+
+    def test_default_falls_back_to_getitem(self):
+        dataset = RandomData(30, 3)
+        data, labels = Dataset.get_batch(dataset, [1, 2])
+        np.testing.assert_array_equal(data, dataset.data[[1, 2]])
+        np.testing.assert_array_equal(labels, dataset.labels[[1, 2]])
+
+    def test_empty_batches(self, p3b3_root, kmnist_root):
+        assert len(collate([])) == 0
+        datasets = [
+            RandomData(30, 3),
+            Subset(RandomMultiTaskData(30, 2, 3), [4, 2]),
+            P3B3(p3b3_root, 'train', transform=lambda doc: doc + 1),
+            KuzushijiMNIST(kmnist_root, 'test', target_transform=lambda y: y * 2),
+        ]
+        for dataset in datasets:
+            data, targets = dataset.get_batch([])
+            assert len(data) == 0
+            for value in (targets.values() if hasattr(targets, 'keys') else [targets]):
+                assert len(value) == 0
+
+    def test_torch_dataloader_collates_samples(self):
+        from torch.utils.data import DataLoader
+
+        dataset = RandomData(30, 3)
+        data, labels = next(iter(DataLoader(dataset, batch_size=8)))
+        assert data.shape == (8,) and labels.shape == (8,)
+        np.testing.assert_array_equal(data.numpy(), dataset.data[:8])
+        np.testing.assert_array_equal(labels.numpy(), dataset.labels[:8])
+
+        dataset = RandomMultiTaskData(30, 2, 3)
+        data, labels = next(iter(DataLoader(dataset, batch_size=8)))
+        assert torch.equal(data, dataset.data[:8])
+        np.testing.assert_array_equal(labels['task1'].numpy(), dataset.labels['task1'][:8])
+
+
+class TestPrepare(object):
+
+    def test_kuzushiji_from_raw(self, tmpdir, monkeypatch):
+        raw = tmpdir.mkdir('KuzushijiMNIST').mkdir('raw')
+        rng = np.random.RandomState(0)
+        arrays = {}
+        for partition, size in [('train', 20), ('test', 10)]:
+            arrays[partition] = rng.randint(255, size=(size, 28, 28)).astype(np.uint8)
+            np.savez_compressed(str(raw.join(f'kmnist-{partition}-imgs.npz')), arrays[partition])
+            np.savez_compressed(str(raw.join(f'kmnist-{partition}-labels.npz')), np.arange(size))
+
+        monkeypatch.setattr('datastore.data.kuzushiji.download_urls', lambda *args, **kwargs: None)
+        dataset = KuzushijiMNIST(str(tmpdir), 'test', download=True)
+        np.testing.assert_array_equal(dataset.data, arrays['test'])
+        np.testing.assert_array_equal(dataset.targets, np.arange(10))
+        assert set(dataset.timings) == {'download', 'processing'}
+
+    def test_p3b3_from_raw(self, tmpdir, monkeypatch):
+        raw = tmpdir.mkdir('P3B3').mkdir('raw')
+        for partition, size in [('train', 20), ('test', 10)]:
+            np.save(str(raw.join(f'{partition}-data.npy')), np.arange(size * 15).reshape(size, 15))
+            np.save(str(raw.join(f'{partition}-labels.npy')), np.zeros((size, 4), dtype=int))
+
+        monkeypatch.setattr('datastore.data.p3b3.download_urls', lambda *args, **kwargs: None)
+        dataset = P3B3(str(tmpdir), 'train', download=True)
+        np.testing.assert_array_equal(dataset.data, np.arange(300).reshape(20, 15))
+
+    def test_uno_reads_tables_in_chunks(self):
+        frames = {
+            'x_train_0': pd.DataFrame(np.arange(70.).reshape(10, 7)),
+            'y_train': pd.DataFrame({'AUC': np.linspace(0, 1, 10), 'Sample': range(10)}),
+        }
+
+        class Store(object):
+            selects = []
+
+            def get_storer(self, key):
+                return type('Storer', (), {'nrows': len(frames[key])})
+
+            def select(self, key, start, stop):
+                self.selects.append((start, stop))
+                return frames[key].iloc[start:stop]
+
+        store = Store()
+        gene_data = Uno.read_table(store, 'x_train_0', chunksize=4)
+        np.testing.assert_array_equal(gene_data, frames['x_train_0'].values)
+        assert Store.selects == [(0, 4), (4, 8), (8, 10)]
+
+        targets = Uno.read_targets(Uno.__new__(Uno), store, 'train')
+        np.testing.assert_array_equal(targets['response'], [1] * 5 + [0] * 5)
+
+
+    def test_uno_from_raw_writes_columns_in_place(self, tmpdir, monkeypatch):
+        frames = {}
+        for split, size in [('train', 12), ('val', 5)]:
+            frames[f'x_{split}_0'] = pd.DataFrame(np.arange(size * 6.).reshape(size, 6))
+            frames[f'x_{split}_1'] = pd.DataFrame(-np.arange(size * 4.).reshape(size, 4))
+            frames[f'y_{split}'] = pd.DataFrame({'AUC': np.linspace(0, 1, size)})
+
+        class Store(object):
+
+            def __init__(self, path, mode):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def get_storer(self, key):
+                return type('Storer', (), {'nrows': len(frames[key])})
+
+            def select(self, key, start, stop):
+                return frames[key].iloc[start:stop]
+
+        saved = []
+        save = np.save
+        monkeypatch.setattr(pd, 'HDFStore', Store)
+        monkeypatch.setattr('datastore.data.uno.download_url', lambda *args, **kwargs: None)
+        def record(path, array):
+            saved.append(os.path.basename(path))
+            save(path, array)
+
+        monkeypatch.setattr('datastore.api.columnar.np.save', record)
+
+        dataset = Uno(str(tmpdir), 'test', download=True, inputs=('gene_data', 'drug_data'))
+        np.testing.assert_array_equal(dataset.data['drug_data'].numpy(), frames['x_val_1'].values)
+        assert torch.equal(dataset.targets['response'], torch.tensor([1, 1, 0, 0, 0]))
+        assert len(Uno(str(tmpdir), 'train')) == 12
+        # Input blocks are filled in place, only the labels are saved
+        assert saved == ['labels.response.npy'] * 2
+
+
+@pytest.fixture
+def uno_root(tmpdir):
+    processed = tmpdir.mkdir('Uno').mkdir('processed')
+    for partition, size in [('train', 20), ('test', 10)]:
+        data = {
+            'gene_data': torch.arange(size * 6, dtype=torch.float32).reshape(size, 6),
+            'drug_data': -torch.arange(size * 4, dtype=torch.float32).reshape(size, 4),
+        }
+        labels = {'response': torch.arange(size) % 2}
+        torch.save(data, str(processed.join(f'{partition}_data.pt')))
+        torch.save(labels, str(processed.join(f'{partition}_labels.pt')))
+    return str(tmpdir)
+
+
+class TestUnoInputs(object):
+
+    def test_migrates_and_loads_only_requested_blocks(self, uno_root):
+        dataset = Uno(uno_root, 'train')
+        assert set(dataset.data) == {'gene_data'}
+        data, targets = dataset.get_batch([4, 2])
+        assert torch.equal(data, torch.arange(120.).reshape(20, 6)[[4, 2]])
+        assert targets['response'].tolist() == [0, 0]
+
+    def test_multi_input_batches(self, uno_root):
+        dataset = Uno(uno_root, 'test', inputs=('gene_data', 'drug_data'), mmap=True)
+        (gene, drug), _ = dataset.get_batch([1, 3])
+        assert torch.equal(gene, torch.arange(60.).reshape(10, 6)[[1, 3]])
+        assert torch.equal(drug, -torch.arange(40.).reshape(10, 4)[[1, 3]])
+
+    def test_multi_input_transform(self, uno_root):
+        dataset = Uno(uno_root, 'train', inputs=('gene_data', 'drug_data'),
+                      transform=lambda x: (x[0] * 2, x[1]))
+        gene, drug = dataset.get_batch([1, 2])[0]
+        for row, idx in enumerate([1, 2]):
+            sample = dataset[idx][0]
+            assert torch.equal(gene[row], sample[0])
+            assert torch.equal(drug[row], sample[1])
+        assert torch.equal(gene, torch.arange(120.).reshape(20, 6)[[1, 2]] * 2)
+
+    def test_unknown_input(self, uno_root):
+        with pytest.raises(ValueError):
+            Uno(uno_root, 'train', inputs=('cell_data',))
+
+
+class TestInstrumentation(object):
+
+    def test_counts_fetches_and_transforms(self, kmnist_root):
+        dataset = KuzushijiMNIST(kmnist_root, 'train', transform=lambda x: x.astype(np.float32))
+        dataset[0]
+        assert dataset.stats is None
+
+        with dataset.instrument() as stats:
+            dataset[0]
+            dataset.get_batch([1, 2, 3])
+
+        assert not isinstance(dataset.transform, TimedTransform)
+        exported = stats.as_dict()
+        assert exported['fetch_calls'] == 2
+        assert exported['samples'] == 4
+        assert exported['transform_calls'] == 4
+        assert exported['target_transform_calls'] == 0
+        # The uint8 images read, not the float32 images returned
+        assert exported['bytes_read'] == 4 * (28 * 28 + 8)
+        assert exported['fetch_time'] >= 0
+
+        dataset[0]
+        assert stats.fetch_calls == 2
+
+    def test_bytes_read_exclude_batched_transforms(self, kmnist_root):
+        dataset = KuzushijiMNIST(kmnist_root, 'train', transform=ToFloat(scale=1 / 255))
+        with dataset.instrument() as stats:
+            dataset.get_batch([1, 2, 3])
+        assert stats.bytes_read == 3 * (28 * 28 + 8)
+
+    def test_nested_access_is_one_fetch(self):
+        dataset = RandomData(30, 3)
+        with dataset.instrument() as stats:
+            Dataset.get_batch(dataset, [1, 2, 3])
+        assert (stats.fetch_calls, stats.samples) == (1, 3)
+
+        with dataset.instrument(reset=True) as stats:
+            stats.record_cache(hit=True)
+            stats.record_cache(hit=False)
+        assert stats.as_dict()['cache_hit_rate'] == 0.5
+        assert stats.fetch_calls == 0
+
+    def test_stats_pickle(self):
+        dataset = RandomData(30, 3)
+        with dataset.instrument():
+            dataset[1]
+        copy = pickle.loads(pickle.dumps(dataset))
+        assert copy.stats.fetch_calls == 1
+        with copy.instrument():
+            copy[2]
+        assert copy.stats.fetch_calls == 2
+
+
+class TestMemmap(object):
+
+    def test_p3b3_matches_eager(self, p3b3_root):
+        eager = P3B3(p3b3_root, 'train')
+        mapped = P3B3(p3b3_root, 'train', mmap=True)
+        assert mapped.data._array is None
+        np.testing.assert_array_equal(mapped[5][0], eager[5][0])
+        assert mapped[5][1] == eager[5][1]
+
+    def test_pickle_reopens(self, kmnist_root):
+        dataset = KuzushijiMNIST(kmnist_root, 'train', mmap=True)
+        dataset[0]
+        clone = pickle.loads(pickle.dumps(dataset))
+        assert clone.data._array is None
+        assert len(pickle.dumps(dataset)) < dataset.data.array.nbytes
+        np.testing.assert_array_equal(clone[3][0], dataset[3][0])
+
+
+class TestColumnarCache(object):
+
+    def test_round_trip(self, p3b3_root, tmpdir):
+        dataset = P3B3(p3b3_root, 'train')
+        path = str(tmpdir.join('cache'))
+        dataset.to_cache(path)
+
+        data, labels = RandomData(1, 1).load_cached(path)
+        np.testing.assert_array_equal(data, dataset.data)
+        assert data.dtype == dataset.data.dtype
+        assert list(labels) == list(dataset.targets)
+        for key, value in dataset.targets.items():
+            np.testing.assert_array_equal(labels[key], value)
+
+    def test_tensors_and_columns(self, tmpdir):
+        dataset = RandomMultiTaskData(30, 3, 4)
+        path = str(tmpdir.join('cache'))
+        dataset.to_cache(path)
+
+        data, labels = RandomData(1, 1).load_cached(path, columns=['labels.task1'], mmap=True)
+        assert data is None
+        assert list(labels) == ['task1']
+        np.testing.assert_array_equal(labels['task1'], dataset.labels['task1'])
+
+        data, _ = RandomData(1, 1).load_cached(path, columns=['data'])
+        assert torch.equal(data, dataset.data)
+
+    def test_csv_multitask_labels(self, tmpdir):
+        dataset = RandomMultiTaskData(10, 3, 5)
+        path = str(tmpdir.join('data.csv'))
+        dataset.to_csv(path)
+
+        loaded = RandomMultiTaskData(1, 1, 1)
+        loaded.load_cached(path)
+        assert isinstance(loaded.labels, LabelStore)
+        assert loaded[3][1] == dataset[3][1]
+        for key, value in dataset.labels.items():
+            np.testing.assert_array_equal(loaded.index_labels([2, 7])[key], value[[2, 7]])
+
+
+class TestChunkedFrames(object):
+
+    def test_chunks_match_dataframe(self, p3b3_root):
+        dataset = P3B3(p3b3_root, 'train', mmap=True)
+        frames = list(dataset.iter_dataframes(chunksize=6))
+        assert [len(frame) for frame in frames] == [6, 6, 6, 2]
+
+        whole = dataset.dataframe()
+        joined = pd.concat(frames)
+        assert list(joined.columns) == list(whole.columns)
+        np.testing.assert_array_equal(joined['grade'], whole['grade'])
+        np.testing.assert_array_equal(np.stack(joined['data']), dataset.data)
+
+    def test_subset_fetches_chunks(self, p3b3_root, monkeypatch):
+        dataset = P3B3(p3b3_root, 'train', mmap=True)
+        subset = Subset(dataset, [19, 2, 7, 11, 0])
+
+        def load_data():
+            raise AssertionError('The whole dataset was loaded')
+
+        monkeypatch.setattr(subset, 'load_data', load_data)
+        monkeypatch.setattr(dataset, 'load_data', load_data)
+        frames = list(subset.iter_dataframes(chunksize=2))
+        assert [len(frame) for frame in frames] == [2, 2, 1]
+
+        joined = pd.concat(frames)
+        np.testing.assert_array_equal(joined.index, np.arange(5))
+        np.testing.assert_array_equal(np.stack(joined['data']), dataset.data[subset.indices])
+        np.testing.assert_array_equal(joined['grade'], dataset.targets['grade'][subset.indices])
+
+    def test_chunks_skip_transforms(self, kmnist_root):
+        transform, target_transform = (lambda x: x * 100), (lambda y: y + 1000)
+        dataset = KuzushijiMNIST(kmnist_root, 'train', transform=transform,
+                                 target_transform=target_transform)
+        for source in (dataset, Subset(dataset, np.arange(19, -1, -1))):
+            whole = source.dataframe()
+            joined = pd.concat(source.iter_dataframes(chunksize=7))
+            np.testing.assert_array_equal(np.stack(joined['data']), np.stack(whole['data']))
+            np.testing.assert_array_equal(joined['labels'], whole['labels'])
+        assert dataset.transform is transform
+        assert dataset.target_transform is target_transform
+
+    def test_chunked_csv(self, tmpdir):
+        dataset = RandomData(25, 3)
+        path = str(tmpdir.join('random.csv'))
+        dataset.to_csv(path, chunksize=10)
+
+        frames = list(dataset.iter_cached(path, chunksize=10))
+        assert [len(frame) for frame in frames] == [10, 10, 5]
+        np.testing.assert_array_equal(pd.concat(frames)['labels'], dataset.labels)
+
+    def test_chunked_columnar(self, p3b3_root, tmpdir):
+        dataset = P3B3(p3b3_root, 'test')
+        path = str(tmpdir.join('cache'))
+        dataset.to_cache(path)
+
+        frames = list(dataset.iter_cached(path, chunksize=4, columns=['labels']))
+        assert list(frames[0].columns) == ['subsite', 'laterality', 'behavior', 'grade']
+        np.testing.assert_array_equal(pd.concat(frames)['subsite'], dataset.targets['subsite'])
+
+
+class TestSubset(object):
+
+    def test_nested_subsets_collapse(self):
+        dataset = RandomData(100, 3)
+        outer = Subset(dataset, np.arange(10, 90))
+        inner = Subset(Subset(outer, [5, 6, 7, 70]), [3, 1])
+
+        assert inner.dataset is dataset
+        assert inner.indices.dtype == np.int32
+        np.testing.assert_array_equal(inner.indices, [80, 16])
+        assert inner[0] == dataset[80]
+
+        data, labels = inner.load_data()
+        np.testing.assert_array_equal(data, dataset.data[[80, 16]])
+        np.testing.assert_array_equal(labels, dataset.labels[[80, 16]])
+
+
+def first_label(dataset):
+    return dataset[3][1]
+
+
+class TestSharedMemory(object):
+
+    def test_workers_attach_by_name(self, p3b3_root):
+        dataset = P3B3(p3b3_root, 'train')
+        expected = dataset[3][1]
+        dataset.share_memory()
+
+        assert len(pickle.dumps(dataset)) < dataset.data.nbytes
+        with ProcessPoolExecutor(1) as pool:
+            assert pool.submit(first_label, dataset).result() == expected
+
+        dataset.release_memory()
+        assert not os.path.exists('/dev/shm/' + dataset.data.name)
+
+    def test_tensors(self):
+        dataset = RandomMultiTaskData(20, 3, 2)
+        data = dataset.data.clone()
+        dataset.share_memory()
+        clone = pickle.loads(pickle.dumps(dataset))
+        assert torch.equal(clone.get_batch([1, 5])[0], data[[1, 5]])
+        assert torch.equal(clone[2][0], data[2])
+        dataset.release_memory()
+
+
+class TestLabelStore(object):
+
+    def test_labels_are_per_instance(self):
+        first = RandomMultiTaskData(10, 2, 3)
+        second = RandomMultiTaskData(10, 4, 3)
+        assert list(first.get_tasks()) == ['task0', 'task1']
+        assert list(second.get_tasks()) == ['task0', 'task1', 'task2', 'task3']
+        assert first.labels.array.shape == (10, 2)
+
+    def test_mapping(self):
+        store = LabelStore({'a': np.arange(5), 'b': np.ones(5, dtype=np.int8)})
+        assert store.array.dtype == np.int64
+        store['c'] = np.arange(5) * 2
+        store['a'] = np.zeros(5)
+        assert store.array.shape == (5, 3) and store.array.dtype == np.float64
+        del store['b']
+        assert list(store) == ['a', 'c']
+        np.testing.assert_array_equal(store['c'], np.arange(5) * 2)
+        assert np.shares_memory(store['c'], store.array)
+
+        with pytest.raises(ValueError):
+            store['d'] = np.arange(4)
+
+    def test_gather(self):
+        dataset = RandomMultiTaskData(10, 3, 5)
+        batch = dataset.index_labels([4, 1])
+        sample = dataset.index_labels(4)
+        for task in dataset.get_tasks():
+            np.testing.assert_array_equal(batch[task], dataset.get_label(task)[[4, 1]])
+            assert sample[task] == dataset.get_label(task)[4]
+            assert np.ndim(sample[task]) == 0
+
+    def test_shared(self):
+        dataset = RandomMultiTaskData(10, 3, 5).share_memory()
+        try:
+            copy = pickle.loads(pickle.dumps(dataset))
+            assert isinstance(copy.labels, LabelStore)
+            np.testing.assert_array_equal(copy.index_labels([2, 3])['task1'],
+                                          dataset.get_label('task1')[[2, 3]])
+        finally:
+            dataset.release_memory()
+
+
+class TestSynthetic(object):
+
+    def test_samples_only_depend_on_seed_and_index(self):
+        dataset = SyntheticData(10 ** 12, 4, shape=(3, 5), seed=1)
+        data, labels = dataset.get_batch([10 ** 12 - 1, 7, 7])
+        assert data.shape == (3, 3, 5) and data.dtype == np.float32
+        np.testing.assert_array_equal(data[1], data[2])
+
+        sample, label = SyntheticData(10 ** 12, 4, shape=(3, 5), seed=1)[7]
+        np.testing.assert_array_equal(sample, data[1])
+        assert label == labels[1]
+        assert not np.array_equal(SyntheticData(100, 4, shape=(3, 5), seed=2)[7][0], sample)
+        assert_batch_matches_samples(dataset, [0, 5, 99])
+
+    def test_distributions(self):
+        dataset = SyntheticData(50000, 3, shape=(2,), imbalance=4)
+        data, labels = dataset.load_data()
+        assert abs(data.mean()) < 0.02 and abs(data.std() - 1) < 0.02
+        np.testing.assert_allclose(np.bincount(labels) / len(labels), dataset.weights, atol=0.01)
+        assert dataset.weights[0] / dataset.weights[-1] == pytest.approx(4)
+
+    def test_multitask(self):
+        dataset = SyntheticMultiTaskData(1000, 3, [2, 3, 4], seed=5)
+        assert_batch_matches_samples(dataset, [3, 999, 0])
+        labels = dataset.load_labels()
+        assert [labels[task].max() for task in dataset.get_tasks()] == [1, 2, 3]
+
+        task2 = dataset.get_label('task2')
+        dataset.del_label('task0')
+        assert dataset.get_tasks() == ['task1', 'task2']
+        np.testing.assert_array_equal(dataset.get_label('task2'), task2)
+
+    def test_multitask_labels_are_lazy(self, tmpdir):
+        # Nothing is generated until a task or samples are looked up
+        dataset = SyntheticMultiTaskData(10 ** 9, 3, 4, seed=5)
+        assert list(dataset.labels) == ['task0', 'task1', 'task2']
+        assert dataset.labels.gather(3) == dataset[3][1]
+
+        small = SyntheticMultiTaskData(100, 3, 4, seed=5)
+        np.testing.assert_array_equal(small.labels['task1'][[7, 3]],
+                                      dataset.index_labels([7, 3])['task1'])
+
+        path = str(tmpdir.join('cache'))
+        RandomMultiTaskData(20, 2, 3).to_cache(path)
+        dataset.load_cached(path)
+        assert isinstance(dataset.labels, LabelStore)
+        assert list(dataset.labels) == ['task0', 'task1']
+
+    def test_random_data_is_reproducible(self):
+        first, second = RandomMultiTaskData(20, 2, 3, seed=4), RandomMultiTaskData(20, 2, 3, seed=4)
+        assert torch.equal(first.data, second.data)
+        np.testing.assert_array_equal(first.get_label('task1'), second.get_label('task1'))
+        np.testing.assert_array_equal(RandomData(20, 3, seed=4).data, RandomData(20, 3, seed=4).data)
@@ -1,6 +1,9 @@
 """
 Tests for `datastore` module.
 """
+import subprocess
+import sys
+
 import pytest
 from datastore import datastore
 
@@ -14,6 +17,14 @@ class TestDatastore(object):
     def test_something(self):
         pass
 
+    def test_import_is_lazy(self):
+        code = (
+            'import sys, datastore, datastore.api, datastore.utils, datastore.sampling\n'
+            'print(sorted(m for m in ("torch", "pandas", "sklearn", "tqdm") if m in sys.modules))'
+        )
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        assert out.stdout.strip() == '[]'
+
     @classmethod
     def teardown_class(cls):
         pass
@@ -0,0 +1,50 @@
+"""
+Tests for `datastore.api.loader`.
+"""
+import numpy as np
+import pytest
+
+from datastore.api import BatchLoader
+from datastore.data import RandomData
+
+
+def collect(loader):
+    return [batch for batch in loader]
+
+
+class TestBatchLoader(object):
+
+    def test_sequence_protocol(self):
+        dataset = RandomData(10, 3)
+        loader = BatchLoader(dataset, batch_size=4, shuffle=False)
+        assert len(loader) == 3
+        data, labels = loader[2]
+        np.testing.assert_array_equal(data, dataset.data[8:])
+        with pytest.raises(IndexError):
+            loader[3]
+
+        assert len(BatchLoader(dataset, batch_size=4, drop_last=True)) == 2
+
+    def test_shuffles_every_epoch(self):
+        dataset = RandomData(20, 3)
+        loader = BatchLoader(dataset, batch_size=5, seed=0)
+        first = np.concatenate([data for data, _ in loader])
+        second = np.concatenate([data for data, _ in loader])
+
+        assert loader.epoch == 2
+        np.testing.assert_array_equal(np.sort(first), np.sort(dataset.data))
+        assert not np.array_equal(first, second)
+
+        replay = BatchLoader(dataset, batch_size=5, seed=0)
+        np.testing.assert_array_equal(np.concatenate([data for data, _ in replay]), first)
+
+    @pytest.mark.parametrize('executor', ['thread', 'process'])
+    def test_workers_match_serial(self, executor):
+        dataset = RandomData(50, 3)
+        serial = collect(BatchLoader(dataset, batch_size=8, seed=1))
+        with BatchLoader(dataset, batch_size=8, seed=1, num_workers=2, executor=executor) as loader:
+            prefetched = collect(loader)
+
+        assert len(serial) == len(prefetched) == 7
+        for (a, _), (b, _) in zip(serial, prefetched):
+            np.testing.assert_array_equal(a, b)
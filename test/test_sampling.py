@@ -0,0 +1,107 @@
+"""
+Tests for `datastore.sampling`.
+"""
+import types
+
+import numpy as np
+
+from datastore.api.data import Subset
+from datastore.data import RandomData, RandomMultiTaskData
+from datastore.sampling import (
+    leave_one_out_bootstrap, stratified_split, multitask_stratified_split,
+    multilabel_stratified_split
+)
+from datastore.sampling.bootstrap import bootstrap_indices
+
+
+class TestBootstrap(object):
+
+    def test_out_of_bag(self):
+        train_idx, test_idx = bootstrap_indices(200, 4, prop_train=0.5)
+        assert train_idx.shape == (4, 100)
+        assert train_idx.dtype == np.int32
+        for train, test in zip(train_idx, test_idx):
+            assert len(np.intersect1d(train, test)) == 0
+            np.testing.assert_array_equal(np.union1d(train, test), np.arange(200))
+
+    def test_seed_is_reproducible(self):
+        dataset = RandomData(50, 2)
+        first = leave_one_out_bootstrap(dataset, 3, seed=1)
+        second = leave_one_out_bootstrap(dataset, 3, seed=1)
+        other = leave_one_out_bootstrap(dataset, 3, seed=2)
+
+        for a, b in zip(first, second):
+            np.testing.assert_array_equal(a.train.indices, b.train.indices)
+            np.testing.assert_array_equal(a.test.indices, b.test.indices)
+        assert not np.array_equal(first[0].train.indices, other[0].train.indices)
+
+    def test_lazy_and_parallel_match_eager(self):
+        dataset = RandomData(50, 2)
+        eager = leave_one_out_bootstrap(dataset, 5, chunksize=2)
+        lazy = leave_one_out_bootstrap(dataset, 5, chunksize=2, lazy=True)
+        parallel = leave_one_out_bootstrap(dataset, 5, chunksize=2, num_workers=2)
+
+        assert isinstance(lazy, types.GeneratorType)
+        lazy = list(lazy)
+        assert len(eager) == len(lazy) == len(parallel) == 5
+        for a, b, c in zip(eager, lazy, parallel):
+            np.testing.assert_array_equal(a.train.indices, b.train.indices)
+            np.testing.assert_array_equal(a.train.indices, c.train.indices)
+
+
+class TestStratifiedSplit(object):
+
+    def test_folds_partition_the_data(self):
+        dataset = RandomData(60, 3)
+        splits = stratified_split(dataset, 3)
+        assert len(splits) == 3
+        valid = np.concatenate([split.valid.indices for split in splits])
+        np.testing.assert_array_equal(np.sort(valid), np.arange(60))
+
+    def test_repeats_lazy_and_parallel(self):
+        dataset = RandomMultiTaskData(60, 3, 3)
+        eager = multitask_stratified_split(dataset, 3, 'task1', num_repeats=2)
+        lazy = multitask_stratified_split(dataset, 3, 'task1', num_repeats=2, lazy=True)
+        parallel = multitask_stratified_split(dataset, 3, 'task1', num_repeats=2, num_workers=2)
+
+        assert isinstance(lazy, types.GeneratorType)
+        lazy = list(lazy)
+        assert len(eager) == len(lazy) == len(parallel) == 6
+        for a, b, c in zip(eager, lazy, parallel):
+            np.testing.assert_array_equal(a.valid.indices, b.valid.indices)
+            np.testing.assert_array_equal(a.valid.indices, c.valid.indices)
+        assert not np.array_equal(eager[0].valid.indices, eager[3].valid.indices)
+
+    def test_splits_only_load_labels(self):
+        class LabelsOnly(RandomData):
+            def load_data(self):
+                raise AssertionError('feature data should not be loaded')
+
+        dataset = LabelsOnly(30, 2)
+        splits = stratified_split(Subset(dataset, np.arange(5, 25)), 2)
+        assert sum(len(split.valid) for split in splits) == 20
+
+
+class TestMultilabelStratifiedSplit(object):
+
+    def test_balances_every_task(self):
+        dataset = RandomMultiTaskData(300, 3, 3)
+        # A rare class in every task
+        for i, key in enumerate(dataset.get_tasks()):
+            dataset.labels[key][:] = 0
+            dataset.labels[key][i * 10:i * 10 + 5] = 1
+
+        splits = multilabel_stratified_split(dataset, 5, seed=3)
+        valid = np.concatenate([split.valid.indices for split in splits])
+        np.testing.assert_array_equal(np.sort(valid), np.arange(300))
+
+        for split in splits:
+            assert len(split.valid) == 60
+            labels = split.valid.load_labels()
+            for key in dataset.get_tasks():
+                assert np.sum(labels[key] == 1) == 1
+
+    def test_chosen_tasks(self):
+        dataset = RandomMultiTaskData(100, 3, 4)
+        splits = multilabel_stratified_split(dataset, 4, tasks=['task0', 'task2'], num_repeats=2)
+        assert len(splits) == 8
@@ -0,0 +1,137 @@
+"""
+Tests for the `datastore.store` backends.
+"""
+import pickle
+
+import numpy as np
+import pytest
+import torch
+
+from datastore.data import RandomData, RandomMultiTaskData
+from datastore.store import SQLiteDataset, ShardedDataset, assign_shards, write_shards
+
+
+class TestSQLiteDataset(object):
+
+    def test_round_trip(self, tmpdir):
+        source = RandomMultiTaskData(50, 3, 3)
+        path = str(tmpdir.join('data.db'))
+        dataset = SQLiteDataset.ingest(source, path, batch_size=16)
+
+        assert len(dataset) == 50
+        data, labels = dataset[7]
+        assert torch.equal(data, source.data[7])
+        assert labels == source.index_labels(7)
+
+        indices = [9, 3, 3, 40]
+        data, labels = dataset.get_batch(indices)
+        assert torch.equal(data, source.data[indices])
+        np.testing.assert_array_equal(labels['task0'], source.labels['task0'][indices])
+
+        data, labels = dataset.get_batch(np.arange(10, 20))
+        assert torch.equal(data, source.data[10:20])
+
+        data, labels = dataset.get_batch([])
+        assert data.shape == (0,) + source.data.shape[1:]
+        assert len(labels['task2']) == 0
+
+    def test_partitions_and_filters(self, tmpdir):
+        path = str(tmpdir.join('data.db'))
+        train = SQLiteDataset.ingest(RandomData(30, 3, seed=1), path, partition='train')
+        test = SQLiteDataset.ingest(RandomData(20, 3, seed=2), path, partition='test')
+
+        assert len(train) == 30 and len(test) == 20
+        assert len(SQLiteDataset(path)) == 50
+
+        subset = test.query(partition='test', labels=1)
+        expected = RandomData(20, 3, seed=2)
+        assert len(subset) == np.sum(expected.labels == 1)
+        _, labels = subset.load_data()
+        assert np.all(labels == 1)
+
+    def test_pickle(self, tmpdir):
+        path = str(tmpdir.join('data.db'))
+        dataset = SQLiteDataset.ingest(RandomData(10, 2), path)
+        dataset[0]
+        clone = pickle.loads(pickle.dumps(dataset))
+        assert clone[4][0] == dataset[4][0]
+
+    def test_load_labels(self, tmpdir):
+        source = RandomMultiTaskData(40, 3, 3)
+        path = str(tmpdir.join('data.db'))
+        dataset = SQLiteDataset.ingest(source, path)
+
+        labels = dataset.load_labels()
+        assert list(labels) == list(source.labels)
+        for key in labels:
+            np.testing.assert_array_equal(labels[key], source.labels[key])
+            assert labels[key].dtype == source.labels[key].dtype
+
+
+class TestShardedDataset(object):
+
+    def test_assignment_is_balanced_and_deterministic(self):
+        sizes = [100] * 9 + [40]
+        for epoch in range(3):
+            assignment = assign_shards(sizes, 3, epoch=epoch, seed=7)
+            assert sorted(sum(assignment, [])) == list(range(10))
+            loads = [sum(sizes[shard] for shard in shards) for shards in assignment]
+            assert max(loads) - min(loads) <= 100
+            assert assignment == assign_shards(sizes, 3, epoch=epoch, seed=7)
+        assert any(assign_shards(sizes, 3, epoch=0, seed=7) != assign_shards(sizes, 3, epoch=e, seed=7)
+                   for e in range(1, 5))
+
+    def test_more_ranks_than_shards(self, tmpdir):
+        with pytest.raises(ValueError):
+            assign_shards([10, 10, 5], 5)
+
+        path = str(tmpdir.join('shards'))
+        write_shards(RandomData(25, 3), path, shard_size=10)
+        with pytest.raises(ValueError):
+            ShardedDataset(path, rank=4, world_size=5)
+        assert len(ShardedDataset(path, rank=2, world_size=3)) == 5
+
+    def test_ranks_cover_dataset(self, tmpdir):
+        source = RandomMultiTaskData(95, 3, 4)
+        path = str(tmpdir.join('shards'))
+        index = write_shards(source, path, shard_size=10)
+        assert len(index['shards']) == 10
+
+        for epoch in range(2):
+            seen = []
+            for rank in range(4):
+                dataset = ShardedDataset(path, rank=rank, world_size=4, epoch=epoch, mmap=True)
+                assert 20 <= len(dataset) <= 30
+                data, labels = dataset.load_data()
+                assert isinstance(data, torch.Tensor)
+                for shard in dataset.shards:
+                    seen.extend(range(shard * 10, min(shard * 10 + 10, 95)))
+                starts = np.cumsum([0] + [index['shards'][s]['size'] for s in dataset.shards])
+                for shard, start in zip(dataset.shards, starts):
+                    stop = start + index['shards'][shard]['size']
+                    source_rows = np.arange(shard * 10, shard * 10 + stop - start)
+                    assert torch.equal(data[start:stop], source.data[source_rows])
+                    np.testing.assert_array_equal(labels['task2'][start:stop],
+                                                  source.labels['task2'][source_rows])
+            assert sorted(seen) == list(range(95))
+
+    def test_set_epoch_and_batches(self, tmpdir):
+        source = RandomData(40, 3)
+        path = str(tmpdir.join('shards'))
+        write_shards(source, path, shard_size=5)
+
+        dataset = ShardedDataset(path, rank=1, world_size=2, target_transform=np.negative)
+        first = list(dataset.shards)
+        epochs = [first]
+        for epoch in range(1, 4):
+            dataset.set_epoch(epoch)
+            epochs.append(list(dataset.shards))
+            assert len(dataset) == 20
+        assert any(shards != first for shards in epochs[1:])
+
+        data, labels = dataset.get_batch([0, 7, 19])
+        for row, idx in enumerate([0, 7, 19]):
+            assert dataset[idx] == (data[row], labels[row])
+
+        copy = pickle.loads(pickle.dumps(dataset))
+        np.testing.assert_array_equal(copy.get_batch([3, 4])[0], dataset.get_batch([3, 4])[0])
@@ -0,0 +1,57 @@
+"""
+Tests for `datastore.api.transforms`.
+"""
+import numpy as np
+import pytest
+import torch
+
+from datastore.api import Clip, Compose, Lambda, Remap, ToFloat
+from datastore.data import KuzushijiMNIST
+
+
+class TestTransforms(object):
+
+    def test_stages(self):
+        images = np.array([[0, 255], [51, 102]], dtype=np.uint8)
+        np.testing.assert_allclose(ToFloat(scale=1 / 255)(images), [[0, 1], [0.2, 0.4]], rtol=1e-6)
+        assert ToFloat()(torch.ones(2, dtype=torch.uint8)).dtype == torch.float32
+        np.testing.assert_array_equal(Clip(high=100)(np.array([5, 500])), [5, 100])
+        assert torch.equal(Clip(0, 1)(torch.tensor([-1., 2.])), torch.tensor([0., 1.]))
+
+    def test_remap(self):
+        remap = Remap({0: 10, 2: 12})
+        np.testing.assert_array_equal(remap(np.array([2, 0, 2])), [12, 10, 12])
+        assert remap(2) == 12
+        assert torch.equal(remap(torch.tensor([0, 2])), torch.tensor([10, 12]))
+        with pytest.raises(KeyError):
+            remap(np.array([0, 1]))
+        np.testing.assert_array_equal(Remap({0: 1}, default=-1)(np.array([0, 1, 7])), [1, -1, -1])
+
+    def test_batched_stages_run_once_per_batch(self):
+        calls = []
+
+        def per_sample(x):
+            calls.append(x.shape)
+            return x
+
+        batched = Lambda(lambda x: calls.append(x.shape) or x, batched=True)
+        pipeline = Compose([ToFloat(), batched, per_sample])
+        assert not pipeline.batched
+
+        data = pipeline.map_batch(np.ones((5, 10), dtype=np.int64))
+        assert calls == [(5, 10)] + [(10,)] * 5
+        assert data.shape == (5, 10) and data.dtype == np.float32
+
+    def test_dataset_batches_match_samples(self, kmnist_root):
+        transform = Compose([ToFloat(scale=1 / 255), Clip(0, 0.5)])
+        dataset = KuzushijiMNIST(kmnist_root, 'train', transform=transform,
+                                 target_transform=Remap({i: i % 3 for i in range(49)}))
+        data, targets = dataset.get_batch([4, 0, 7])
+        for row, idx in enumerate([4, 0, 7]):
+            sample, target = dataset[idx]
+            np.testing.assert_array_equal(data[row], sample)
+            assert targets[row] == target
+
+        with dataset.instrument() as stats:
+            dataset.get_batch([4, 0, 7])
+        assert stats.transform_calls == {'transform': 1, 'target_transform': 1}
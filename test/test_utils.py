@@ -0,0 +1,179 @@
+"""
+Tests for `datastore.utils`.
+"""
+import os
+import hashlib
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from datastore.utils import utils
+from datastore.utils.utils import (
+    check_integrity, download_url, download_urls, hash_file, hash_files
+)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """ Serves in-memory files with support for HTTP Range requests """
+    files = {}
+    # Number of GET requests to cut off halfway through the body
+    failures = 0
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        content = self.files[self.path]
+        header = self.headers.get('Range')
+        if header is None:
+            return 200, content, len(content)
+        first, last = header[len('bytes='):].split('-')
+        last = int(last) if last else len(content) - 1
+        return 206, content[int(first):last + 1], len(content)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(self.files[self.path])))
+        self.end_headers()
+
+    def do_GET(self):
+        type(self).requests.append((self.path, self.headers.get('Range')))
+        status, body, total = self._body()
+        self.send_response(status)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if type(self).failures:
+            type(self).failures -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    RangeHandler.files = {
+        '/small.bin': os.urandom(50000),
+        '/other.bin': os.urandom(20000),
+        '/large.bin': os.urandom(300000),
+    }
+    RangeHandler.failures = 0
+    RangeHandler.requests = []
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestDownload(object):
+
+    def test_concurrent(self, server, tmpdir):
+        urls = [server + '/small.bin', server + '/other.bin']
+        paths = download_urls(urls, str(tmpdir))
+        assert [os.path.basename(path) for path in paths] == ['small.bin', 'other.bin']
+        assert read(paths[0]) == RangeHandler.files['/small.bin']
+        assert read(paths[1]) == RangeHandler.files['/other.bin']
+
+    def test_resumes_after_failure(self, server, tmpdir):
+        RangeHandler.failures = 1
+        path = download_url(server + '/small.bin', str(tmpdir), 'small.bin', None, backoff=0)
+
+        assert read(path) == RangeHandler.files['/small.bin']
+        assert RangeHandler.requests == [('/small.bin', None), ('/small.bin', 'bytes=25000-')]
+        assert not os.path.exists(path + '.part')
+
+    def test_resumes_partial_file(self, server, tmpdir):
+        content = RangeHandler.files['/small.bin']
+        with open(str(tmpdir.join('small.bin.part')), 'wb') as f:
+            f.write(content[:1000])
+
+        path = download_url(server + '/small.bin', str(tmpdir), 'small.bin', None)
+        assert read(path) == content
+        assert RangeHandler.requests == [('/small.bin', 'bytes=1000-')]
+
+    def test_segments(self, server, tmpdir, monkeypatch):
+        monkeypatch.setattr(utils, 'MIN_SEGMENT_SIZE', 1000)
+        RangeHandler.failures = 1
+        path = download_url(server + '/large.bin', str(tmpdir), 'large.bin', None,
+                            segments=3, backoff=0)
+
+        assert read(path) == RangeHandler.files['/large.bin']
+        ranges = sorted(header for _, header in RangeHandler.requests)
+        assert 'bytes=0-99999' in ranges and 'bytes=200000-299999' in ranges
+        assert len(ranges) == 4
+
+    def test_verifies_checksum(self, server, tmpdir):
+        content = RangeHandler.files['/small.bin']
+        checksum = 'sha256:' + hashlib.sha256(content).hexdigest()
+        paths = download_urls([server + '/small.bin'], str(tmpdir), checksums={'small.bin': checksum})
+        assert read(paths[0]) == content
+
+        with pytest.raises(RuntimeError):
+            download_url(server + '/other.bin', str(tmpdir), 'other.bin', None, checksum='sha256:00')
+
+
+class TestIntegrity(object):
+
+    def test_digests(self, tmpdir):
+        path = str(tmpdir.join('file.bin'))
+        content = os.urandom(3000)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+        assert hash_file(path, 'blake2b') == hashlib.blake2b(content).hexdigest()
+        assert check_integrity(path, md5=hashlib.md5(content).hexdigest())
+        assert check_integrity(path, checksum='sha256:' + hashlib.sha256(content).hexdigest())
+        assert not check_integrity(path, checksum='sha256:' + hashlib.sha256(b'').hexdigest())
+        assert not check_integrity(str(tmpdir.join('missing')), checksum='sha256:00')
+
+    def test_unchanged_files_are_not_rehashed(self, tmpdir, monkeypatch):
+        paths = []
+        for i in range(3):
+            paths.append(str(tmpdir.join('{}.bin'.format(i))))
+            with open(paths[-1], 'wb') as f:
+                f.write(os.urandom(1000))
+
+        calls = []
+        original = utils.hash_file
+        monkeypatch.setattr(utils, 'hash_file', lambda *args: calls.append(args) or original(*args))
+
+        first = hash_files(paths)
+        assert len(calls) == 3
+        assert hash_files(paths) == first
+        assert len(calls) == 3
+
+        with open(paths[1], 'ab') as f:
+            f.write(b'changed')
+        second = hash_files(paths)
+        assert len(calls) == 4
+        assert second[paths[1]] != first[paths[1]]
+        assert second[paths[0]] == first[paths[0]]
+
+    def test_unwritable_cache_is_skipped(self, tmpdir, monkeypatch):
+        path = str(tmpdir.join('file.bin'))
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1000))
+
+        def replace(src, dst):
+            raise PermissionError(13, 'Permission denied', dst)
+
+        monkeypatch.setattr(utils.os, 'replace', replace)
+        assert hash_files([path]) == {path: hash_file(path)}
+        assert check_integrity(path, checksum='sha256:' + hash_file(path))
+        assert sorted(os.listdir(str(tmpdir))) == ['file.bin']